@@ -0,0 +1,170 @@
+'''
+Copyright 2019 Secure Shed Project Dev Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+# Fuzz the REST message schemas that have a generated fast validator (see
+# common/SchemaValidators.py) and check that it accepts and rejects exactly
+# the same instances as jsonschema.
+import argparse
+import importlib
+import logging
+import os
+import random
+import sys
+import jsonschema
+
+
+## Modules holding the REST message schemas.
+SCHEMA_MODULES = ('APIs.CentralController.JsonSchemas',
+                  'APIs.Keypad.JsonSchemas')
+
+## Values used to build the fuzzed instances, covering each JSON type and the
+#  edge cases of the type and range checks.
+VALUES = (None, True, False, 0, 1, -1, 5, 10**20, 0.0, 1.0, 2.5, -0.5,
+          float('nan'), float('inf'), float('-inf'), '', '1234', 'A', [],
+          [1], {}, {'a': 1})
+
+## Keys that no schema defines, to exercise additionalProperties.
+EXTRA_KEYS = ('x', 'additionalProperties')
+
+
+## Get the schemas that have a fast validator.
+#  @returns List of (name, schema) tuples.
+def find_schemas():
+    schemas = []
+
+    for module_name in SCHEMA_MODULES:
+        module = importlib.import_module(module_name)
+
+        for name, value in sorted(vars(module).items()):
+            if isinstance(value, type) and hasattr(value, 'Validate'):
+                schemas.append((f'{module_name}.{name}', value.Schema))
+
+    return schemas
+
+
+## Generate a random instance for a schema, mostly objects built from the
+#  schema's own properties.  Some instances have all of the required
+#  properties set, so that a useful number of them are valid.
+#  @param rnd Random number generator.
+#  @param schema JSON schema.
+#  @returns Instance.
+def generate_instance(rnd, schema):
+    if rnd.random() < 0.05:
+        return rnd.choice(VALUES)
+
+    keys = list(schema.get('properties', {})) + list(EXTRA_KEYS)
+    instance = {key: rnd.choice(VALUES)
+                for key in rnd.sample(keys, rnd.randrange(len(keys) + 1))}
+
+    if rnd.random() < 0.5:
+        for key in schema.get('required', []):
+            instance[key] = rnd.choice(VALUES)
+
+    return instance
+
+
+## Check the fast validator of a schema against jsonschema.
+#  @param rnd Random number generator.
+#  @param schema JSON schema.
+#  @param iterations Number of instances to check.
+#  @returns Tuple of (number of valid instances, list of mismatches).
+def check_schema(rnd, schema, iterations):
+    # pylint: disable=import-outside-toplevel
+    from common.SchemaValidators import CompileFastCheck, GetFastValidator
+
+    validator = jsonschema.validators.validator_for(schema)(schema)
+    validate = GetFastValidator(schema)
+    fast_check = CompileFastCheck(schema)
+    valid_count = 0
+    mismatches = []
+
+    for _ in range(iterations):
+        instance = generate_instance(rnd, schema)
+        expected = validator.is_valid(instance)
+        valid_count += expected
+
+        try:
+            validate(instance)
+            accepted = True
+
+        except jsonschema.exceptions.ValidationError:
+            accepted = False
+
+        # An instance the fast check rejects is passed on to jsonschema, so
+        # the generated check is also compared directly.
+        if accepted != expected or \
+           (fast_check is not None and fast_check(instance) != expected):
+            mismatches.append((instance, expected))
+
+    return valid_count, mismatches
+
+
+def main():
+    logging.getLogger().setLevel(logging.INFO)
+
+    parser = argparse.ArgumentParser(prog="SCHEMA CONFORMANCE")
+
+    parser.add_argument('-p',
+                        '--path',
+                        help='path to the source directory | '
+                             'Default: %(default)s | '
+                             'Type: %(type)s ',
+                        default=os.path.join(os.path.dirname(
+                            os.path.abspath(__file__)), '..', 'src'),
+                        type=str)
+
+    parser.add_argument('-i',
+                        '--iterations',
+                        help='instances to check per schema | '
+                             'Default: %(default)s | '
+                             'Type: %(type)s ',
+                        default=20000,
+                        type=int)
+
+    parser.add_argument('-s',
+                        '--seed',
+                        help='random seed | '
+                             'Default: %(default)s | '
+                             'Type: %(type)s ',
+                        default=0,
+                        type=int)
+
+    args = parser.parse_args()
+    sys.path.insert(0, args.path)
+
+    rnd = random.Random(args.seed)
+    failed = False
+
+    for name, schema in find_schemas():
+        valid_count, mismatches = check_schema(rnd, schema, args.iterations)
+
+        for instance, expected in mismatches[:10]:
+            logging.error('%s | jsonschema %s %r, the fast validator '
+                          'does not', name,
+                          'accepts' if expected else 'rejects', instance)
+
+        logging.info('%s | Instances: %s | Valid: %s | Mismatches: %s',
+                     name, args.iterations, valid_count, len(mismatches))
+        failed = failed or bool(mismatches)
+
+    if failed:
+        logging.error('Schema Conformance Failed | Seed: %s', args.seed)
+        sys.exit(1)
+
+    logging.info('Schema Conformance Passed | Seed: %s', args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,7 @@ limitations under the License.
 '''
 # pylint: disable=C0103
 # pylint: disable=R0903
+from common.SchemaValidators import GetFastValidator, GetValidator
 
 
 AUTH_KEY = 'authorisationKey'
@@ -28,12 +29,20 @@ class ReceiveKeyCode:
         "properties" : {
             "additionalProperties" : False,
             "keySequence" : {"type" : "string"},
+            "zone" : {"type" : "string"},
         },
         "required": ["keySequence"]
     }
 
+    ## Validator compiled once, at import.
+    Validator = GetValidator(Schema)
+
+    ## Generated fast-path validation function, see GetFastValidator().
+    Validate = GetFastValidator(Schema)
+
     class BodyElement:
         KeySeq = 'keySequence'
+        Zone = 'zone'
 
 
 class RetrieveConsoleLogs:
@@ -52,6 +61,12 @@ class RetrieveConsoleLogs:
         "required": ["startTimestamp"]
     }
 
+    ## Validator compiled once, at import.
+    Validator = GetValidator(Schema)
+
+    ## Generated fast-path validation function, see GetFastValidator().
+    Validate = GetFastValidator(Schema)
+
     class BodyElement:
         StartTimestamp = 'startTimestamp'
 
@@ -92,6 +107,9 @@ class RequestLogsResponse:
         "additionalProperties" : False
     }
 
+    ## Validator compiled once, at import.
+    Validator = GetValidator(Schema)
+
     class BodyElement:
         LastTimestamp = 'lastTimestamp'
         Entries = 'entries'
@@ -15,6 +15,7 @@ limitations under the License.
 '''
 # pylint: disable=C0103
 # pylint: disable=R0903
+from common.SchemaValidators import GetFastValidator, GetValidator
 
 
 AUTH_KEY = 'authorisationKey'
@@ -37,6 +38,12 @@ class KeypadLockRequest:
         "additionalProperties" : False
     }
 
+    ## Validator compiled once, at import.
+    Validator = GetValidator(Schema)
+
+    ## Generated fast-path validation function, see GetFastValidator().
+    Validate = GetFastValidator(Schema)
+
     class BodyElement:
         LockTime = 'lockTime'
 
@@ -57,6 +64,12 @@ class RetrieveConsoleLogs:
         "required": ["startTimestamp"]
     }
 
+    ## Validator compiled once, at import.
+    Validator = GetValidator(Schema)
+
+    ## Generated fast-path validation function, see GetFastValidator().
+    Validate = GetFastValidator(Schema)
+
     class BodyElement:
         StartTimestamp = 'startTimestamp'
 
@@ -97,6 +110,9 @@ class RequestLogsResponse:
         "additionalProperties" : False
     }
 
+    ## Validator compiled once, at import.
+    Validator = GetValidator(Schema)
+
     class BodyElement:
         LastTimestamp = 'lastTimestamp'
         Entries = 'entries'
@@ -29,3 +29,29 @@ class BaseDeviceType:
     #  @param self The object pointer.
     def receive_event(self, event):
         raise NotImplementedError
+
+
+    ## Pins that the device wants to be notified of edges (state changes) on,
+    #  a device that returns any pins has pin_state_changed() called when one
+    #  changes instead of check_device() being polled.
+    #  @param self The object pointer.
+    #  @returns List of pin numbers, empty if the device needs polling.
+    def edge_detect_pins(self):
+        # pylint: disable=no-self-use
+        return []
+
+
+    ## Called when the state of one of the pins returned by edge_detect_pins()
+    #  has changed.
+    #  @param self The object pointer.
+    #  @param pin Pin number that has changed.
+    #  @param state New state of the pin.
+    def pin_state_changed(self, pin, state):
+        raise NotImplementedError
+
+
+    ## Called when the device is removed, e.g. because devices.json has been
+    #  reloaded, so it can release anything it holds (timers, outputs etc.).
+    #  @param self The object pointer.
+    def shutdown(self):
+        pass
@@ -15,6 +15,7 @@ limitations under the License.
 '''
 from central_controller.DeviceTypes.base_device_type import BaseDeviceType
 import central_controller.events as Evts
+from central_controller.io_pin_address import IoPinAddress
 from common.Logger import LogType
 
 
@@ -37,8 +38,6 @@ class GenericAlarmSiren(BaseDeviceType):
         self._device_name = device_name
         self._additional_params = additional_params
 
-        pin_prefix = 'GPIO'
-
         # Expecting one pin.
         if len(pins) != 1:
             self._logger.Log(LogType.Warn,
@@ -53,7 +52,7 @@ class GenericAlarmSiren(BaseDeviceType):
                              device_name, self.ExpectedPinId)
             return False
 
-        self._io_pin = int(pin[0]['ioPin'][len(pin_prefix):])
+        self._io_pin = IoPinAddress.to_pin_number(pin[0]['ioPin'])
         self._hardware_io.setup(self._io_pin, self._hardware_io.OUT)
         self._hardware_io.output(self._io_pin, self._hardware_io.HIGH)
 
@@ -70,3 +69,10 @@ class GenericAlarmSiren(BaseDeviceType):
 
         elif event.id == Evts.EvtType.DeactivateSiren:
             self._hardware_io.output(self._io_pin, self._hardware_io.HIGH)
+
+
+    ## Make sure a removed siren isn't left sounding.
+    #  @param self The object pointer.
+    def shutdown(self):
+        if self._io_pin is not None:
+            self._hardware_io.output(self._io_pin, self._hardware_io.HIGH)
@@ -14,9 +14,9 @@ See the License for the specific language governing permissions and
 limitations under the License.
 '''
 import enum
-import time
 from central_controller.DeviceTypes.base_device_type import BaseDeviceType
 import central_controller.events as Evts
+from central_controller.io_pin_address import IoPinAddress
 from common.Event import Event
 from common.Logger import LogType
 
@@ -46,7 +46,8 @@ class MagneticContactSensor(BaseDeviceType):
         self._hardware_io = hardwareIO
         self._is_triggered = False
         self._device_name = None
-        self._grace_timeout = None
+        self._grace_timer = None
+        self._grace_period_id = 0
         self._additional_params = None
         self._logger = logger
         self._state_type = self.StateType.AlarmInactive
@@ -61,8 +62,6 @@ class MagneticContactSensor(BaseDeviceType):
         self._device_name = device_name
         self._additional_params = additional_params
 
-        pin_prefix = 'GPIO'
-
         # Expecting one pin.
         if len(pins) != 1:
             self._logger.Log(LogType.Warn,
@@ -77,7 +76,7 @@ class MagneticContactSensor(BaseDeviceType):
                              device_name, self.ExpectedPinId)
             return False
 
-        self._io_pin = int(pin[0]['ioPin'][len(pin_prefix):])
+        self._io_pin = IoPinAddress.to_pin_number(pin[0]['ioPin'])
         self._hardware_io.setup(self._io_pin, self._hardware_io.IN,
                                 pull_up_down=self._hardware_io.PUD_UP)
 
@@ -88,54 +87,77 @@ class MagneticContactSensor(BaseDeviceType):
     #  triggered etc.
     #  @param self The object pointer.
     def check_device(self):
-        contact_state = self._hardware_io.input(self._io_pin)
-
         # If we are in the alarmed set grace period then the triggered flag is
-        # not changable until the grace period has expired.  Once it has then
-        # revert the grace period type which means if the sensor is in a
-        # triggered state (open) then an alarm event is raised.
-        if self._state_type == self.StateType.AlarmSetPeriod:
-            self._handle_alarm_set_grace_period(contact_state)
-
-        # If we are in the alarm unset period (if no action e.g. typing in the
-        # right key code is entered then the alarm is triggered) then the
-        # triggered flag is not changable until the grace period has expired or
-        # the alarm has been acknowledged.  If after the grace period the alarm
-        # hasn't been acknowledged the an alarm even is raised.
-        elif self._state_type == self.StateType.AlarmUnsetPeriod:
-            self._handle_alarm_unset_grace_period()
-
-        else:
-            # The alarm has been triggered, don't change the state or allow the
-            # the grace period to be updated so just return out of function.
-            if self._is_triggered:
+        # not changable until the grace period has expired.  If we are in the
+        # alarm unset period (if no action e.g. typing in the right key code
+        # is entered then the alarm is triggered) then the triggered flag is
+        # not changable until the grace period has expired or the alarm has
+        # been acknowledged.  The end of either grace period is signalled by a
+        # scheduled SensorGracePeriodExpired event.
+        if self._state_type in (self.StateType.AlarmSetPeriod,
+                                self.StateType.AlarmUnsetPeriod):
+            return
+
+        # The alarm has been triggered, don't change the state or allow the
+        # the grace period to be updated so just return out of function.
+        if self._is_triggered:
+            return
+
+        self._process_contact_state(self._hardware_io.input(self._io_pin))
+
+
+    ## The sensor pin uses edge detection, so the device is only checked when
+    #  the contact actually changes state.
+    #  @param self The object pointer.
+    def edge_detect_pins(self):
+        return [self._io_pin]
+
+
+    ## The contact state has changed.
+    #  @param self The object pointer.
+    #  @param pin Pin number that has changed.
+    #  @param state New state of the pin.
+    def pin_state_changed(self, pin, state):
+        # pylint: disable=unused-argument
+        if self._state_type in (self.StateType.AlarmSetPeriod,
+                                self.StateType.AlarmUnsetPeriod):
+            return
+
+        if self._is_triggered:
+            return
+
+        self._process_contact_state(state)
+
+
+    ## Process the current state of the contact when not in a grace period.
+    #  @param self The object pointer.
+    #  @param contact_state State of the contact pin.
+    def _process_contact_state(self, contact_state):
+        if self._is_triggered != contact_state:
+            state_msg = "opened" if contact_state else "closed"
+
+            # If the alarm is inactive then just change state change.
+            if self._state_type == self.StateType.AlarmInactive:
+                self._logger.Log(LogType.Info,
+                                 "Device '%s' was %s",
+                                 self._device_name, state_msg)
+                self._is_triggered = contact_state
                 return
 
-            if self._is_triggered != contact_state:
-                state_msg = "opened" if contact_state else "closed"
-
-                # If the alarm is inactive then just change state change.
-                if self._state_type == self.StateType.AlarmInactive:
-                    self._logger.Log(LogType.Info,
-                                     "Device '%s' was %s",
-                                     self._device_name, state_msg)
-                    self._is_triggered = contact_state
-                    return
-
-                grace_secs = self._additional_params['triggerGracePeriodSecs']
-                if grace_secs:
-                    self._state_type = self.StateType.AlarmUnsetPeriod
-                    self._logger.Log(LogType.Info,
-                                     "Device '%s' sensor triggered, " + \
-                                     "entered grace period of %s seconds",
-                                     self._device_name, grace_secs)
-                    self._grace_timeout = time.time() + grace_secs
-
-                else:
-                    self._is_triggered = contact_state
-                    self._logger.Log(LogType.Info, "Device '%s' was %s",
-                                     self._device_name, state_msg)
-                    self._generate_device_state_change_evt()
+            grace_secs = self._additional_params.get('triggerGracePeriodSecs')
+            if grace_secs:
+                self._state_type = self.StateType.AlarmUnsetPeriod
+                self._logger.Log(LogType.Info,
+                                 "Device '%s' sensor triggered, " + \
+                                 "entered grace period of %s seconds",
+                                 self._device_name, grace_secs)
+                self._start_grace_timer(grace_secs)
+
+            else:
+                self._is_triggered = contact_state
+                self._logger.Log(LogType.Info, "Device '%s' was %s",
+                                 self._device_name, state_msg)
+                self._generate_device_state_change_evt()
 
 
     ## Recieve events from the event manager, these include the change of the
@@ -144,20 +166,61 @@ class MagneticContactSensor(BaseDeviceType):
     #  @param eventInst Event instance.
     def receive_event(self, event):
         if event.id == Evts.EvtType.AlarmActivated:
-            if 'triggerGracePeriodSecs' in self._additional_params:
-                grace_secs = self._additional_params['triggerGracePeriodSecs']
-                self._grace_timeout = event.body['activationTimestamp'] + \
-                    grace_secs
+            grace_secs = self._additional_params.get('triggerGracePeriodSecs')
+            if grace_secs:
+                # The grace period runs from when the alarm was activated, so
+                # take off any time the event spent waiting to be dispatched.
+                activation_time = event.body['activationTimestamp']
+                elapsed = self._event_mgr.Clock.Time() - activation_time
+                self._start_grace_timer(grace_secs - elapsed)
                 self._logger.Log(LogType.Info,
                                  "Alarm activated, device '%s' is in " + \
                                  "grace period of %s seconds",
                                  self._device_name, grace_secs)
                 self._state_type = self.StateType.AlarmSetPeriod
-            self._is_triggered = False
+                self._is_triggered = False
+
+            # Without a grace period the sensor is armed straight away.  Edge
+            # detection only reports changes, so a contact that is already
+            # open has to be checked now.
+            else:
+                self._state_type = self.StateType.AlarmActivate
+                self._is_triggered = False
+                self._process_contact_state(
+                    self._hardware_io.input(self._io_pin))
 
         elif event.id == Evts.EvtType.AlarmDeactivated:
+            self._cancel_grace_timer()
             self._state_type = self.StateType.AlarmInactive
 
+        elif event.id == Evts.EvtType.SensorGracePeriodExpired:
+            # An expiry that was already due when its timer was cancelled
+            # can still be delivered, it must not end a later grace period.
+            grace_period_id = event.body.get(
+                Evts.SensorDeviceBodyItem.GracePeriodId)
+            if self._grace_timer is None or \
+               grace_period_id != self._grace_period_id:
+                return
+
+            self._grace_timer = None
+
+            # If we are in the alarmed set grace period then once it has
+            # expired revert the grace period type which means if the sensor
+            # is in a triggered state (open) then an alarm event is raised.
+            if self._state_type == self.StateType.AlarmSetPeriod:
+                self._handle_alarm_set_grace_period_expired()
+
+            # If after the alarm unset grace period the alarm hasn't been
+            # acknowledged then an alarm event is raised.
+            elif self._state_type == self.StateType.AlarmUnsetPeriod:
+                self._handle_alarm_unset_grace_period_expired()
+
+
+    ## The sensor is being removed, so stop its grace period timer.
+    #  @param self The object pointer.
+    def shutdown(self):
+        self._cancel_grace_timer()
+
 
     ## Generate and queue the event when a device state changes.
     #  @param self The object pointer.
@@ -171,39 +234,45 @@ class MagneticContactSensor(BaseDeviceType):
         self._event_mgr.QueueEvent(evt)
 
 
+    ## Schedule the SensorGracePeriodExpired event for this device, replacing
+    #  any grace period timer that is already running.
     #  @param self The object pointer.
-    def _handle_alarm_set_grace_period(self, contact_state):
-        curr_time = time.time()
+    #  @param grace_secs Length of the grace period in seconds.
+    def _start_grace_timer(self, grace_secs):
+        self._cancel_grace_timer()
+        self._grace_period_id += 1
 
-        # Still in grace period, thus _is_triggered flag currently cannot be
-        # changed.
-        if curr_time <= self._grace_timeout:
-            return
+        evt_body = {
+            Evts.SensorDeviceBodyItem.DeviceType: self.SensorName,
+            Evts.SensorDeviceBodyItem.DeviceName: self._device_name,
+            Evts.SensorDeviceBodyItem.GracePeriodId: self._grace_period_id
+        }
+        evt = Event(Evts.EvtType.SensorGracePeriodExpired, evt_body)
+        self._grace_timer = self._event_mgr.ScheduleEvent(grace_secs, evt)
+
+
+    #  @param self The object pointer.
+    def _cancel_grace_timer(self):
+        if self._grace_timer is not None:
+            self._event_mgr.CancelScheduledEvent(self._grace_timer)
+            self._grace_timer = None
 
+
+    #  @param self The object pointer.
+    def _handle_alarm_set_grace_period_expired(self):
         # The grace period has expired, change to the state 'AlarmActivate'
-        # and then check the trigger state.
+        # and then check the trigger state.  Changes of the contact during
+        # the grace period were ignored, so its current state is read.
         self._state_type = self.StateType.AlarmActivate
         self._logger.Log(LogType.Info,
                          "Device '%s' alarm set grace period ended...",
                          self._device_name)
 
-        if contact_state:
-            self._logger.Log(LogType.Info,
-                             "Device '%s' caused alarm to trigger",
-                             self._device_name)
-            self._is_triggered = True
-            self._generate_device_state_change_evt()
+        self._process_contact_state(self._hardware_io.input(self._io_pin))
 
 
     #  @param self The object pointer.
-    def _handle_alarm_unset_grace_period(self):
-        curr_time = time.time()
-
-        # Still in grace period, thus _is_triggered flag currently cannot be
-        # changed.
-        if curr_time <= self._grace_timeout:
-            return
-
+    def _handle_alarm_unset_grace_period_expired(self):
         # If we have come out of the grace period and the alarm hasn't been
         # deactivated during this time then trigger the alarm.
         self._logger.Log(LogType.Info,
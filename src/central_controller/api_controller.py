@@ -66,6 +66,10 @@ class ApiController:
         self._endpoint.add_url_rule('/_health_status', methods=['GET'],
                                     view_func=self._health_status)
 
+        # Add route : /reloadDevices
+        self._endpoint.add_url_rule('/reloadDevices', methods=['POST'],
+                                    view_func=self._reload_devices)
+
 
     ## API route : receiveKeyCode
     #  Recieve a key code from the keypad.  This is for unlocking/disabling the
@@ -95,8 +99,7 @@ class ApiController:
         # Validate that the json body conforms to the expected schema.
         # If the message isn't valid then a 400 error should be generated.
         try:
-            jsonschema.validate(instance=body,
-                                schema=schemas.ReceiveKeyCode.Schema)
+            schemas.ReceiveKeyCode.Validate(body)
 
         except jsonschema.exceptions.ValidationError:
             err_msg = 'Message body validation failed.'
@@ -148,8 +151,7 @@ class ApiController:
         # Validate that the json body conforms to the expected schema.
         # If the message isn't valid then a 400 error should be generated.
         try:
-            jsonschema.validate(instance=body,
-                                schema=schemas.RetrieveConsoleLogs.Schema)
+            schemas.RetrieveConsoleLogs.Validate(body)
 
         except jsonschema.exceptions.ValidationError:
             err_msg = 'Message body validation failed.'
@@ -166,6 +168,25 @@ class ApiController:
 
 
 
+    ## API route : reloadDevices
+    #  Reload the devices and device types configuration files without
+    #  restarting the controller.  The reload happens on the worker thread,
+    #  so this returns as soon as the request has been queued.
+    #  Return codes:
+    #  * 200 (OK) - reload requested.
+    #  * 401 (Unauthenticated) - Missing or invalid authentication key.
+    def _reload_devices(self):
+        validate_return = self._validate_auth_key()
+        if validate_return is not None:
+            return validate_return
+
+        self._event_mgr.QueueEvent(Event(Evts.EvtType.DevicesConfigReload))
+
+        return self._endpoint.response_class(
+            response='Ok', status=HTTPStatusCode.OK,
+            mimetype=MIMEType.Text)
+
+
     def _health_status(self):
         # Validate the request to ensure that the auth key is firstly present,
         # then if it's valid.  None is returned if successful.
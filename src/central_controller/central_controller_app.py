@@ -13,6 +13,7 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 '''
+import math
 import os
 import signal
 import sys
@@ -21,12 +22,15 @@ from central_controller.api_controller import ApiController
 from central_controller.configuration_manager import ConfigurationManager
 from central_controller.controller_db_interface import ControllerDBInterface
 from central_controller.devices_config_loader import DevicesConfigLoader
-from central_controller.device_manager import DeviceManager
+from central_controller.device_manager import DeviceManager, RPIO_EMULATED
 from central_controller.device_type_manager import DeviceTypeManager
 import central_controller.events as Evts
+from central_controller.file_change_detector import FileChangeDetector
 from central_controller.log_store import LogStore
+from central_controller.scenario_player import ScenarioPlayer
 from central_controller.state_manager import StateManager
 from central_controller.worker_thread import WorkerThread
+from common.Clock import CreateClock
 from common.Event import Event
 from common.EventManager import EventManager
 from common.Version import COPYRIGHT, VERSION
@@ -35,19 +39,38 @@ from common.Logger import Logger, LogType
 class CentralControllerApp:
     # pylint: disable=too-many-instance-attributes
 
-    __slots__ = ['_config_file', '_curr_devices', '__db', '_device_mgr',
-                 '_endpoint', '_event_manager', '_logger', '_log_store',
-                 '_state_mgr', '_worker_thread']
+    __slots__ = ['_clock', '_config_file', '_configuration', '_curr_devices',
+                 '__db', '_device_mgr', '_device_type_mgr', '_devices_changes',
+                 '_device_types_changes', '_endpoint', '_event_manager',
+                 '_init_timeout', '_init_workers', '_logger', '_log_store',
+                 '_pin_bank_file', '_scenario_file',
+                 '_scenario_results_file', '_scenario_speed', '_state_mgr',
+                 '_worker_thread']
+
+    ## How often (in seconds) the devices and device types configuration
+    #  files are checked for changes.
+    DevicesConfigCheckSecs = 5.0
 
 
     def __init__(self, endpoint):
+        self._clock = None
         self._config_file = os.getenv('CENCON_CONFIG')
+        self._configuration = None
         self._curr_devices = None
         self.__db = os.getenv('CENCON_DB')
         self._device_mgr = None
+        self._device_type_mgr = None
+        self._devices_changes = None
+        self._device_types_changes = None
         self._endpoint = endpoint
         self._event_manager = None
+        self._init_timeout = os.getenv('CENCON_INIT_TIMEOUT')
+        self._init_workers = os.getenv('CENCON_INIT_WORKERS')
         self._log_store = LogStore()
+        self._pin_bank_file = os.getenv('CENCON_PIN_BANK')
+        self._scenario_file = os.getenv('CENCON_SCENARIO')
+        self._scenario_results_file = os.getenv('CENCON_SCENARIO_RESULTS')
+        self._scenario_speed = os.getenv('CENCON_SCENARIO_SPEED')
         self._state_mgr = None
         self._worker_thread = None
         self._logger = Logger()
@@ -78,12 +101,33 @@ class CentralControllerApp:
                              config_manger.last_error_msg)
             sys.exit(1)
 
+        try:
+            self._clock = CreateClock(os.getenv('CENCON_CLOCK_SPEED'),
+                                      os.getenv('CENCON_CLOCK_ANCHOR'))
+
+        except ValueError as excpt:
+            self._logger.Log(LogType.Error,
+                             'Invalid clock configuration ' +
+                             '(CENCON_CLOCK_SPEED/CENCON_CLOCK_ANCHOR), ' +
+                             'reason : %s', excpt)
+            sys.exit(1)
+
         self._logger.Log(LogType.Info, '=== Configuration Parameters ===')
         self._logger.Log(LogType.Info, 'Environment Variables:')
         self._logger.Log(LogType.Info, '|=> Configuration file       : %s',
                          self._config_file)
         self._logger.Log(LogType.Info, '|=> Database                 : %s',
                          self.__db)
+        self._logger.Log(LogType.Info, '|=> Emulated Pin Bank        : %s',
+                         self._pin_bank_file)
+        self._logger.Log(LogType.Info, '|=> Emulator Scenario        : %s',
+                         self._scenario_file)
+        self._logger.Log(LogType.Info, '|=> Clock                    : %s',
+                         type(self._clock).__name__)
+        self._logger.Log(LogType.Info, '|=> Device Init Workers      : %s',
+                         self._init_workers)
+        self._logger.Log(LogType.Info, '|=> Device Init Timeout      : %s',
+                         self._init_timeout)
         self._logger.Log(LogType.Info, '===================================')
         self._logger.Log(LogType.Info, '=== Configuration File Settings ===')
         self._logger.Log(LogType.Info, 'General Settings:')
@@ -103,7 +147,10 @@ class CentralControllerApp:
                          configuration.central_controller_api.networkPort)
         self._logger.Log(LogType.Info, '================================')
 
-        self._event_manager = EventManager()
+        self._event_manager = EventManager(
+            eventPriorities=Evts.EVENT_PRIORITIES,
+            coalescingPolicies=Evts.EVENT_COALESCING_POLICIES,
+            clock=self._clock)
 
         controller_db = ControllerDBInterface()
         if not controller_db.connect(self.__db):
@@ -125,11 +172,12 @@ class CentralControllerApp:
             self._logger.Log(LogType.Error, device_type_mgr.last_error_msg)
             sys.exit(1)
 
-        device_type_mgr.load_device_types()
+        self._device_type_mgr = device_type_mgr
+        self._configuration = configuration
 
         # Load the devices configuration file which contains the devices
-        # attached to the alarm.  The devices are matched to the device types
-        # loaded above.
+        # attached to the alarm.  Only the plug-ins of the device types that
+        # the enabled devices use are loaded.
         devices_cfg = configuration.general_settings.devicesConfigFile
         devices_cfg_loader = DevicesConfigLoader()
         self._curr_devices = devices_cfg_loader.read_devices_config_file(devices_cfg)
@@ -137,21 +185,56 @@ class CentralControllerApp:
             self._logger.Log(LogType.Error, devices_cfg_loader.last_error_msg)
             sys.exit(1)
 
-        self._device_mgr = DeviceManager(device_type_mgr, self._event_manager,
-                                         self._logger)
         dev_lst = self._curr_devices[devices_cfg_loader.JsonTopElement.Devices]
+        device_type_mgr.load_device_types(
+            devices_cfg_loader.device_types_in_use(dev_lst))
+
+        self._device_mgr = DeviceManager(device_type_mgr, self._event_manager,
+                                         self._logger, self._pin_bank_file)
         self._device_mgr.load(dev_lst)
-        self._device_mgr.initialise_hardware()
+
+        # Devices can optionally be initialised concurrently, which speeds up
+        # startup when plug-ins do slow hardware probing.
+        try:
+            init_workers = int(self._init_workers) \
+                if self._init_workers else None
+            init_timeout = float(self._init_timeout) \
+                if self._init_timeout else None
+
+        except ValueError:
+            self._logger.Log(LogType.Error,
+                             'Invalid device initialisation workers/timeout')
+            sys.exit(1)
+
+        self._device_mgr.initialise_hardware(init_workers, init_timeout)
+
+        # Each zone of devices has its own alarm state.
+        self._state_mgr.set_device_zones(self._device_mgr.device_zones)
 
         self._register_event_callbacks()
 
+        # Watch the devices and device types configuration files, changes to
+        # either are applied without restarting the controller.
+        self._devices_changes = FileChangeDetector(devices_cfg)
+        self._device_types_changes = FileChangeDetector(
+            configuration.general_settings.deviceTypesConfigFile)
+        self._devices_changes.has_changed()
+        self._device_types_changes.has_changed()
+        self._event_manager.ScheduleEvent(
+            self.DevicesConfigCheckSecs,
+            Event(Evts.EvtType.DevicesConfigCheck))
+
+        scenario_player = self._load_scenario() if self._scenario_file \
+            else None
+
         # Create the IO processing thread which handles IO requests from
         # hardware devices.
         self._worker_thread = WorkerThread(configuration,
                                            self._device_mgr,
                                            self._event_manager,
                                            self._state_mgr,
-                                           self._logger)
+                                           self._logger,
+                                           scenario_player)
         self._worker_thread.start()
 
         # pylint: disable=unused-variable
@@ -170,6 +253,105 @@ class CentralControllerApp:
         self._log_store.add_log_event(curr_time, log_level, msg)
 
 
+    ## Load the emulator scenario to play back, this is only possible when the
+    #  Raspberry Pi IO is being emulated.
+    #  @param self The object pointer.
+    #  @returns ScenarioPlayer instance or None if not available.
+    def _load_scenario(self):
+        if not RPIO_EMULATED:
+            self._logger.Log(LogType.Warn,
+                             'Ignoring scenario, it needs IO emulation')
+            return None
+
+        speed = None
+
+        # The speed divides the step times, so it must be a positive number.
+        if self._scenario_speed:
+            try:
+                speed = float(self._scenario_speed)
+
+            except ValueError:
+                speed = None
+
+            if speed is None or not 0 < speed < math.inf:
+                self._logger.Log(LogType.Error,
+                                 "Invalid scenario speed '%s', it must be a " +
+                                 "number greater than zero",
+                                 self._scenario_speed)
+                sys.exit(1)
+
+        scenario_player = ScenarioPlayer(self._event_manager, self._logger,
+                                         speed, self._scenario_results_file,
+                                         self._device_mgr.sample_pins)
+
+        if not scenario_player.load(self._scenario_file):
+            self._logger.Log(LogType.Error,
+                             "Unable to load scenario '%s', reason: %s",
+                             self._scenario_file,
+                             scenario_player.last_error_msg)
+            sys.exit(1)
+
+        return scenario_player
+
+
+    ## Event handler for Evts.EvtType.DevicesConfigCheck, reload the devices
+    #  if either of their configuration files have changed.  The check is
+    #  rescheduled each time, so it runs for as long as the controller does.
+    #  @param self The object pointer.
+    #  @param event Event instance (unused).
+    def _check_devices_config(self, event):
+        # pylint: disable=unused-argument
+
+        # Both detectors are checked so that they both see the latest state.
+        devices_changed = self._devices_changes.has_changed()
+        device_types_changed = self._device_types_changes.has_changed()
+
+        if devices_changed or device_types_changed:
+            self._logger.Log(LogType.Info,
+                             'Devices configuration has changed, reloading')
+            self._reload_devices(event)
+
+        self._event_manager.ScheduleEvent(
+            self.DevicesConfigCheckSecs,
+            Event(Evts.EvtType.DevicesConfigCheck))
+
+
+    ## Event handler for Evts.EvtType.DevicesConfigReload, reload the device
+    #  types and devices configuration files and apply the changes to the
+    #  running devices.  This runs on the worker thread, so it never races
+    #  with the device scan, and the alarm state is kept.  If either file
+    #  is invalid the current devices are left as they are.
+    #  @param self The object pointer.
+    #  @param event Event instance (unused).
+    def _reload_devices(self, event):
+        # pylint: disable=unused-argument
+        general_settings = self._configuration.general_settings
+
+        if not self._device_type_mgr.read_device_types_config(
+                general_settings.deviceTypesConfigFile):
+            self._logger.Log(LogType.Error,
+                             'Devices not reloaded, reason: %s',
+                             self._device_type_mgr.last_error_msg)
+            return
+
+        devices_cfg_loader = DevicesConfigLoader()
+        devices = devices_cfg_loader.read_devices_config_file(
+            general_settings.devicesConfigFile)
+        if not devices:
+            self._logger.Log(LogType.Error,
+                             'Devices not reloaded, reason: %s',
+                             devices_cfg_loader.last_error_msg)
+            return
+
+        dev_lst = devices[devices_cfg_loader.JsonTopElement.Devices]
+        self._device_type_mgr.load_device_types(
+            devices_cfg_loader.device_types_in_use(dev_lst))
+        self._curr_devices = devices
+
+        self._device_mgr.reload(dev_lst, self._state_mgr.armed_zones())
+        self._state_mgr.set_device_zones(self._device_mgr.device_zones)
+
+
     def _register_event_callbacks(self):
 
         # =============================
@@ -190,11 +372,11 @@ class CentralControllerApp:
 
         # Register event: Activate alarm sirens.
         self._event_manager.RegisterEvent(Evts.EvtType.ActivateSiren,
-                                          self._device_mgr.receive_event)
+                                          self._device_mgr.process_activate_siren_event)
 
         # Register event: Deactivate alarm sirens.
         self._event_manager.RegisterEvent(Evts.EvtType.DeactivateSiren,
-                                          self._device_mgr.receive_event)
+                                          self._device_mgr.process_deactivate_siren_event)
 
         # =========================================
         # == Register event : Alarm state change ==
@@ -202,11 +384,33 @@ class CentralControllerApp:
 
         # Register event: Alarm activated.
         self._event_manager.RegisterEvent(Evts.EvtType.AlarmActivated,
-                                          self._device_mgr.receive_event)
+                                          self._device_mgr.process_alarm_activated_event)
+
+        # Register event: Edge detected on a device pin.
+        self._event_manager.RegisterEvent(
+            Evts.EvtType.DevicePinEdge,
+            self._device_mgr.process_device_pin_edge_event)
+
+        # Register event: Sensor grace period has expired.
+        self._event_manager.RegisterEvent(
+            Evts.EvtType.SensorGracePeriodExpired,
+            self._device_mgr.process_sensor_grace_period_expired_event)
 
         # Register event: Alarm activated.
         self._event_manager.RegisterEvent(Evts.EvtType.AlarmDeactivated,
-                                          self._device_mgr.receive_event)
+                                          self._device_mgr.process_alarm_deactivated_event)
+
+        # ====================================
+        # == Register event : Configuration ==
+        # ====================================
+
+        # Register event: Check if the devices configuration has changed.
+        self._event_manager.RegisterEvent(Evts.EvtType.DevicesConfigCheck,
+                                          self._check_devices_config)
+
+        # Register event: Reload the devices configuration.
+        self._event_manager.RegisterEvent(Evts.EvtType.DevicesConfigReload,
+                                          self._reload_devices)
 
 
         # =================================
@@ -215,11 +419,13 @@ class CentralControllerApp:
 
         # Register event: Request sending of 'Alive Ping' message.
         self._event_manager.RegisterEvent(Evts.EvtType.KeypadApiSendAlivePing,
-                                          self._state_mgr.send_alive_ping_msg)
+                                          self._state_mgr.send_alive_ping_msg,
+                                          blocking=True)
 
         # Register event: Request sending of 'Keypad Locked' message.
         self._event_manager.RegisterEvent(Evts.EvtType.KeypadApiSendKeypadLock,
-                                          self._state_mgr.send_keypad_locked_msg)
+                                          self._state_mgr.send_keypad_locked_msg,
+                                          blocking=True)
 
 
     def _signal_handler(self, signum, frame):
@@ -237,3 +443,5 @@ class CentralControllerApp:
             time.sleep(1)
 
         self._logger.Log(LogType.Info, 'Worker thread has Shut down')
+
+        self._event_manager.Shutdown()
@@ -19,6 +19,7 @@ from central_controller.configuration import Configuration
 from central_controller.configuration_json_schema import CONFIGURATIONJSONSCHEMA
 from central_controller.failed_code_attempt_action import (FailedCodeAttemptActionType,
                                                            ACTION_TYPE_PARAMS)
+from common.SchemaValidators import Validate
 
 
 class ConfigurationManager:
@@ -99,8 +100,7 @@ class ConfigurationManager:
             return None
 
         try:
-            jsonschema.validate(instance=config_json,
-                                schema=CONFIGURATIONJSONSCHEMA)
+            Validate(config_json, CONFIGURATIONJSONSCHEMA)
 
         except jsonschema.exceptions.ValidationError:
             self._last_error_msg = f"Configuration file {filename} failed " + \
@@ -15,8 +15,16 @@ limitations under the License.
 '''
 # pylint: disable=ungrouped-imports
 import collections
+import concurrent.futures
+import queue
+import threading
+import time
 from central_controller.devices_config_loader import DevicesConfigLoader
 import central_controller.events as Evts
+from central_controller.io_pin_address import IoPinAddress
+from central_controller.isolated_device import IsolatedDevice
+from central_controller.pin_debounce_filter import create_debounce_filter
+from common.Event import Event
 from common.Logger import LogType
 
 try:
@@ -28,112 +36,180 @@ except ModuleNotFoundError:
 
 
 class DeviceManager:
-    __slots__ = ['_devices', '_device_type_mgr', '_event_mgr', '_logger']
+    # pylint: disable=too-many-instance-attributes
 
-    Device = collections.namedtuple('Device',
-                                    'name hardware deviceType pins triggerGracePeriod')
+    __slots__ = ['_debounce_filters', '_devices', '_devices_by_hardware',
+                 '_devices_by_name', '_devices_by_pin', '_devices_by_zone',
+                 '_device_type_mgr', '_edge_devices', '_event_mgr',
+                 '_filters_updated', '_isolated_devices', '_logger',
+                 '_pin_sample', '_polled_devices', '_settling_filters',
+                 '_watched_pin_mask']
+
+    Device = collections.namedtuple(
+        'Device',
+        'name hardware deviceType pins triggerGracePeriod debounce zone '
+        'config')
+
+    ## Translation table that maps every byte of a pin sample to a 0 or 1
+    #  level, any non-zero value is a high pin.
+    PinLevels = bytes(1) + b'\x01' * 255
+
+    ## Property getter : Zone of each device, device name => zone.
+    @property
+    def device_zones(self):
+        return {device.name: device.zone for device in self._devices}
 
 
     #  @param self The object pointer.
-    def __init__(self, deviceTypeMgr, eventMgr, logger):
+    #  @param deviceTypeMgr Device type manager instance.
+    #  @param eventMgr Event manager instance.
+    #  @param logger Logger instance.
+    #  @param pinBankFile Optional shared memory pin bank file for emulation.
+    def __init__(self, deviceTypeMgr, eventMgr, logger, pinBankFile=None):
+        self._debounce_filters = {}
         self._device_type_mgr = deviceTypeMgr
         self._devices = []
+        self._devices_by_hardware = {}
+        self._devices_by_name = {}
+        self._devices_by_pin = {}
+        self._devices_by_zone = {}
+        self._edge_devices = {}
         self._event_mgr = eventMgr
+        self._filters_updated = set()
+        self._isolated_devices = []
         self._logger = logger
+        self._pin_sample = None
+        self._polled_devices = []
+        self._settling_filters = {}
+        self._watched_pin_mask = 0
 
         if RPIO_EMULATED:
             self._logger.Log(LogType.Info, 'Using Raspberry PI IO Emulation...')
             GPIO.logger = logger
 
+            if pinBankFile:
+                self._logger.Log(LogType.Info,
+                                 "Using shared memory pin bank '%s'",
+                                 pinBankFile)
+                GPIO.use_shared_memory_pin_bank(pinBankFile)
+
         GPIO.setmode(GPIO.BCM)
 
 
     #  @param self The object pointer.
     def load(self, devices):
-        device_types = self._device_type_mgr.device_types
-
-        for device in devices:
-            name = device[DevicesConfigLoader.DeviceElement.Name]
-            enabled = device[DevicesConfigLoader.DeviceElement.Enabled]
-
-            if not enabled:
-                self._logger.Log(LogType.Warn,
-                                 "Device '%s' is disabled, not loading it!", name)
-                continue
+        for device_cfg in devices:
+            device = self._create_device(device_cfg)
+            if device is not None:
+                self._devices.append(device)
 
-            try:
-                trigger_grace_period = \
-                    device[DevicesConfigLoader.DeviceElement.TriggerGracePeriodSecs]
-
-            except KeyError:
-                trigger_grace_period = None
+        self._rebuild_device_indexes()
 
-            pins = device[DevicesConfigLoader.DeviceElement.Pins]
-            hardware = device[DevicesConfigLoader.DeviceElement.Hardware]
-            device_type = device[DevicesConfigLoader.DeviceElement.DeviceType]
 
-            if device_type not in device_types:
-                self._logger.Log(LogType.Warn,
-                                 "Ignoring device '%s' as it has invalid " +\
-                                 "device type of '%s'", name, device_type)
+    ## Initialise the devices' plug-ins, devices that fail to initialise are
+    #  dropped.  Plug-ins may do slow work (e.g. probing I2C devices), so the
+    #  devices can be initialised concurrently on a bounded number of threads.
+    #  @param self The object pointer.
+    #  @param max_workers Number of devices to initialise at once, None or 1
+    #         initialises them one after another.
+    #  @param timeout_secs Time (in seconds) a device has to initialise when
+    #         initialised concurrently, None = no limit.
+    def initialise_hardware(self, max_workers=None, timeout_secs=None):
+        start_time = time.monotonic()
+
+        if max_workers and max_workers > 1 and len(self._devices) > 1:
+            initialised = self._initialise_devices_concurrently(max_workers,
+                                                                timeout_secs)
+
+        else:
+            initialised = [device for device in self._devices
+                           if self._timed_initialise_device(device)]
+
+        self._logger.Log(LogType.Info,
+                         'Initialised %s of %s devices in %.3f seconds',
+                         len(initialised), len(self._devices),
+                         time.monotonic() - start_time)
+
+        self._devices = initialised
+        self._rebuild_device_indexes()
+        self._setup_edge_detection()
+
+
+    ## Reload the devices from a new devices configuration without stopping
+    #  the controller.  Devices whose configuration and device type are
+    #  unchanged are left running (keeping their state and grace timers),
+    #  removed or changed devices are shut down and new or changed devices
+    #  are created and initialised.  Sensors added to an armed zone start
+    #  their set grace period, as if the alarm had just been activated.
+    #  @param self The object pointer.
+    #  @param devices Devices configuration (the devices.json devices array).
+    #  @param armed_zones Zones that are currently armed.
+    def reload(self, devices, armed_zones=()):
+        current = {device.name: device for device in self._devices}
+        name_element = DevicesConfigLoader.DeviceElement.Name
+        type_element = DevicesConfigLoader.DeviceElement.DeviceType
+
+        kept = []
+        new_devices = []
+        wanted = set()
+
+        for device_cfg in devices:
+            name = device_cfg[name_element]
+            wanted.add(name)
+            existing = current.get(name)
+
+            if existing is not None and existing.config == device_cfg and \
+               self._plugin_is_unchanged(existing,
+                                         device_cfg[type_element]):
+                kept.append(existing)
                 continue
 
-            try:
-                device_inst = device_types[device_type](GPIO, self._event_mgr)
-                new_device = self.Device(name=name, hardware=hardware,
-                                         deviceType=device_inst, pins=pins,
-                                         triggerGracePeriod=trigger_grace_period)
-                self._devices.append(new_device)
-
-            except TypeError:
-                self._logger.Log(LogType.Warn,
-                                 "Ignoring device '%s' as unable to " +\
-                                 "instantiate device type of '%s'", name,
-                                 device_type)
-                continue
+            if existing is not None:
+                self._teardown_device(existing)
 
+            device = self._create_device(device_cfg)
+            if device is not None and self._initialise_device(device):
+                new_devices.append(device)
 
-    #  @param self The object pointer.
-    def initialise_hardware(self):
+        removed = [device for name, device in current.items()
+                   if name not in wanted]
+        for device in removed:
+            self._teardown_device(device)
 
-        devices = []
+        self._devices = kept + new_devices
+        self._rebuild_device_indexes()
+        self._setup_edge_detection()
 
-        for device in self._devices:
-            try:
-                additional_params = {
-                    'triggerGracePeriodSecs': device.triggerGracePeriod
-                }
+        self._arm_new_sensors(new_devices, armed_zones)
 
-                if not device.deviceType.initialise(device.name, device.pins,
-                                                    additional_params):
-                    self._logger.Log(LogType.Error,
-                                     "Device plug-in '%s' initialisation" + \
-                                     " failed so cannot be used.", device.name)
-                    continue
+        self._logger.Log(LogType.Info,
+                         'Devices reloaded: %s unchanged, %s added or ' +\
+                         'changed, %s removed', len(kept), len(new_devices),
+                         len(removed))
 
-                devices.append(device)
 
-            except NotImplementedError:
-                self._logger.Log(LogType.Error,
-                                 "Device name '%s' plug-in does not " + \
-                                 "implement initialise() so cannot be used.",
-                                 device.name)
+    #  @param self The object pointer.
+    def check_hardware_devices(self):
 
-            except TypeError:
-                self._logger.Log(LogType.Error,
-                                 "Device name '%s' plug-in has syntax " + \
-                                 "error(s) so cannot be used.", device.name)
+        self._filters_updated.clear()
 
-        self._devices = devices
+        if RPIO_EMULATED:
+            GPIO.update_emulated_pins()
+            self.sample_pins()
 
+        self._sample_settling_filters()
 
-    #  @param self The object pointer.
-    def check_hardware_devices(self):
+        # Collect the replies from plug-ins hosted in their own process, this
+        # never waits on a plug-in.
+        restarted = [device for device in self._isolated_devices
+                     if device.deviceType.service()]
 
-        if RPIO_EMULATED:
-            GPIO.update_from_pinout_file()
+        if restarted:
+            self._refresh_restarted_devices(restarted)
 
-        for device in self._devices:
+        # Devices watching pins are notified when their pins change, so only
+        # the remaining devices need polling.
+        for device in self._polled_devices:
             try:
                 device.deviceType.check_device()
 
@@ -150,25 +226,53 @@ class DeviceManager:
         GPIO.cleanup()
 
 
+    ## Event handler for Evts.EvtType.DevicePinEdge, the devices watching the
+    #  pin are told of the new pin state.
     #  @param self The object pointer.
-    def receive_event(self, event):
-        # Event : Activate siren.
-        if event.id == Evts.EvtType.ActivateSiren:
-            self._process_activate_siren_event(event)
+    def process_device_pin_edge_event(self, event):
+        pin = event.body[Evts.DevicePinEdgeBodyItem.Pin]
+        self._notify_pin_state_changed(pin, GPIO.input(pin))
+
+
+    ## Sample all of the emulated pins in one bulk read and notify the devices
+    #  watching any pins that have changed since the last sample.  When
+    #  nothing has changed this is a single comparison, however many devices
+    #  there are.
+    #  @param self The object pointer.
+    def sample_pins(self):
+        sample = self._read_pin_sample()
+        previous = self._pin_sample
+
+        if sample == previous:
+            return
+
+        self._pin_sample = sample
+
+        if previous is None:
+            return
 
-        elif event.id == Evts.EvtType.DeactivateSiren:
-            self._process_deactivate_siren_event(event)
+        # The pin bank may have grown, new pins start high.
+        if len(previous) < len(sample):
+            previous += b'\x01' * (len(sample) - len(previous))
 
-        elif event.id == Evts.EvtType.AlarmActivated:
-            self._process_alarm_activated_event(event)
+        # Each pin is a byte in the sample, so XOR'ing the samples as integers
+        # leaves bit (pin * 8) set for every pin that has changed.
+        changed = int.from_bytes(previous, 'little') ^ \
+            int.from_bytes(sample, 'little')
+        changed &= self._watched_pin_mask
 
-        elif event.id == Evts.EvtType.AlarmDeactivated:
-            self._process_alarm_deactivated_event(event)
+        while changed:
+            lowest_bit = changed & -changed
+            pin = (lowest_bit.bit_length() - 1) // 8
+            changed ^= lowest_bit
+            self._notify_pin_state_changed(pin, sample[pin])
 
 
+    ## Event handler for Evts.EvtType.ActivateSiren.
     #  @param self The object pointer.
-    def _process_activate_siren_event(self, event):
-        sirens = [s for s in self._devices if s.hardware == 'siren']
+    def process_activate_siren_event(self, event):
+        sirens = self._devices_for_event(
+            event, DevicesConfigLoader.DeviceHardwareType.Siren)
 
         for siren in sirens:
             self._logger.Log(LogType.Info, "Activating alarm siren '%s'",
@@ -176,9 +280,11 @@ class DeviceManager:
             siren.deviceType.receive_event(event)
 
 
+    ## Event handler for Evts.EvtType.DeactivateSiren.
     #  @param self The object pointer.
-    def _process_deactivate_siren_event(self, event):
-        sirens = [s for s in self._devices if s.hardware == 'siren']
+    def process_deactivate_siren_event(self, event):
+        sirens = self._devices_for_event(
+            event, DevicesConfigLoader.DeviceHardwareType.Siren)
 
         for siren in sirens:
             self._logger.Log(LogType.Info,
@@ -186,12 +292,14 @@ class DeviceManager:
             siren.deviceType.receive_event(event)
 
 
+    ## Event handler for Evts.EvtType.AlarmActivated.
     #  @param self The object pointer.
-    def _process_alarm_activated_event(self, event):
+    def process_alarm_activated_event(self, event):
         if event.body['noGraceTime']:
             return
 
-        sensors = [s for s in self._devices if s.hardware == 'sensor']
+        sensors = self._devices_for_event(
+            event, DevicesConfigLoader.DeviceHardwareType.Sensor)
         for sensor in sensors:
             try:
                 sensor.deviceType.receive_event(event)
@@ -202,9 +310,22 @@ class DeviceManager:
                                  sensor.name)
 
 
+    ## Event handler for Evts.EvtType.SensorGracePeriodExpired, the event is
+    #  only passed to the device whose grace period has expired.
     #  @param self The object pointer.
-    def _process_alarm_deactivated_event(self, event):
-        sensors = [s for s in self._devices if s.hardware == 'sensor']
+    def process_sensor_grace_period_expired_event(self, event):
+        device_name = event.body[Evts.SensorDeviceBodyItem.DeviceName]
+        device = self._devices_by_name.get(device_name)
+
+        if device is not None:
+            device.deviceType.receive_event(event)
+
+
+    ## Event handler for Evts.EvtType.AlarmDeactivated.
+    #  @param self The object pointer.
+    def process_alarm_deactivated_event(self, event):
+        sensors = self._devices_for_event(
+            event, DevicesConfigLoader.DeviceHardwareType.Sensor)
         for sensor in sensors:
             try:
                 sensor.deviceType.receive_event(event)
@@ -213,3 +334,493 @@ class DeviceManager:
                 self._logger.Log(LogType.Error,
                                  "Device '%s' missing receive_event()",
                                  sensor.name)
+
+
+    ## Create a device (and its plug-in instance) from its configuration.
+    #  @param self The object pointer.
+    #  @param device_cfg Device's entry from the devices configuration.
+    #  @returns Device or None if the device is disabled or can't be created.
+    def _create_device(self, device_cfg):
+        device_types = self._device_type_mgr.device_types
+        name = device_cfg[DevicesConfigLoader.DeviceElement.Name]
+        enabled = device_cfg[DevicesConfigLoader.DeviceElement.Enabled]
+
+        if not enabled:
+            self._logger.Log(LogType.Warn,
+                             "Device '%s' is disabled, not loading it!", name)
+            return None
+
+        try:
+            trigger_grace_period = \
+                device_cfg[DevicesConfigLoader.DeviceElement.TriggerGracePeriodSecs]
+
+        except KeyError:
+            trigger_grace_period = None
+
+        debounce = device_cfg.get(DevicesConfigLoader.DeviceElement.Debounce)
+        zone = device_cfg.get(DevicesConfigLoader.DeviceElement.Zone,
+                              DevicesConfigLoader.DefaultZone)
+        pins = device_cfg[DevicesConfigLoader.DeviceElement.Pins]
+        hardware = device_cfg[DevicesConfigLoader.DeviceElement.Hardware]
+        device_type = device_cfg[DevicesConfigLoader.DeviceElement.DeviceType]
+
+        if device_type not in device_types:
+            self._logger.Log(LogType.Warn,
+                             "Ignoring device '%s' as it has invalid " +\
+                             "device type of '%s'", name, device_type)
+            return None
+
+        if not RPIO_EMULATED and self._uses_expander_pins(pins):
+            self._logger.Log(LogType.Warn,
+                             "Ignoring device '%s' as GPIO expander " +\
+                             "pins are only supported in emulation", name)
+            return None
+
+        try:
+            if device_type in self._device_type_mgr.isolated_device_types:
+                device_inst = IsolatedDevice(device_types[device_type], GPIO,
+                                             self._event_mgr, self._logger)
+
+            else:
+                device_inst = device_types[device_type](GPIO, self._event_mgr,
+                                                        self._logger)
+
+        except TypeError:
+            self._logger.Log(LogType.Warn,
+                             "Ignoring device '%s' as unable to " +\
+                             "instantiate device type of '%s'", name,
+                             device_type)
+            return None
+
+        return self.Device(name=name, hardware=hardware,
+                           deviceType=device_inst, pins=pins,
+                           triggerGracePeriod=trigger_grace_period,
+                           debounce=debounce, zone=zone, config=device_cfg)
+
+
+    ## Initialise a device's plug-in.
+    #  @param self The object pointer.
+    #  @param device Device to initialise.
+    #  @returns True if the device initialised and can be used.
+    def _initialise_device(self, device):
+        try:
+            additional_params = {
+                'triggerGracePeriodSecs': device.triggerGracePeriod
+            }
+
+            if not device.deviceType.initialise(device.name, device.pins,
+                                                additional_params):
+                self._logger.Log(LogType.Error,
+                                 "Device plug-in '%s' initialisation" + \
+                                 " failed so cannot be used.", device.name)
+                return False
+
+            return True
+
+        except NotImplementedError:
+            self._logger.Log(LogType.Error,
+                             "Device name '%s' plug-in does not " + \
+                             "implement initialise() so cannot be used.",
+                             device.name)
+
+        except TypeError:
+            self._logger.Log(LogType.Error,
+                             "Device name '%s' plug-in has syntax " + \
+                             "error(s) so cannot be used.", device.name)
+
+        return False
+
+
+    ## Initialise a device, reporting how long it took.
+    #  @param self The object pointer.
+    #  @param device Device to initialise.
+    #  @returns True if the device initialised and can be used.
+    def _timed_initialise_device(self, device):
+        start_time = time.monotonic()
+        success = self._initialise_device(device)
+        self._logger.Log(LogType.Debug,
+                         "Device '%s' initialisation took %.3f seconds",
+                         device.name, time.monotonic() - start_time)
+        return success
+
+
+    ## Initialise the devices on a bounded number of daemon threads.  A
+    #  device that hasn't initialised before its timeout is dropped, a thread
+    #  cannot be stopped so it is left to finish in the background and its
+    #  result is ignored.  The threads are daemon threads (unlike a
+    #  ThreadPoolExecutor's, which are joined at exit) so that a plug-in that
+    #  never returns doesn't stop the controller from exiting.
+    #  @param self The object pointer.
+    #  @param max_workers Maximum number of devices to initialise at once.
+    #  @param timeout_secs Time (in seconds) each device has to initialise,
+    #         None = no limit.
+    #  @returns List of the devices that initialised, in their original
+    #           order.
+    def _initialise_devices_concurrently(self, max_workers, timeout_secs):
+        start_times = {}
+        pending = queue.SimpleQueue()
+        futures = []
+
+        for device in self._devices:
+            future = concurrent.futures.Future()
+            pending.put((device, future))
+            futures.append((device, future))
+
+        def initialise():
+            while True:
+                try:
+                    device, future = pending.get_nowait()
+
+                except queue.Empty:
+                    return
+
+                future.set_running_or_notify_cancel()
+                start_times[device.name] = time.monotonic()
+
+                try:
+                    future.set_result(self._timed_initialise_device(device))
+
+                except Exception as excpt:  # pylint: disable=broad-except
+                    future.set_exception(excpt)
+
+        for index in range(min(max_workers, len(futures))):
+            threading.Thread(target=initialise, name=f'DeviceInit_{index}',
+                             daemon=True).start()
+
+        initialised = []
+        for device, future in futures:
+            try:
+                if self._wait_for_device_init(future, start_times,
+                                              device.name, timeout_secs):
+                    initialised.append(device)
+
+            except concurrent.futures.TimeoutError:
+                self._logger.Log(LogType.Error,
+                                 "Device '%s' didn't initialise within %s " +\
+                                 "seconds so cannot be used.", device.name,
+                                 timeout_secs)
+
+            except Exception as excpt:  # pylint: disable=broad-except
+                self._logger.Log(LogType.Error,
+                                 "Device '%s' initialisation raised '%s' " +\
+                                 "so cannot be used.", device.name, excpt)
+
+        return initialised
+
+
+    ## Wait for a device to initialise on the thread pool.  The timeout runs
+    #  from when the device started initialising, not from when it was
+    #  queued, so devices waiting for a free worker aren't timed out.
+    #  @param self The object pointer.
+    #  @param future Future of the device's initialisation.
+    #  @param start_times Device name => time its initialisation started.
+    #  @param name Name of the device.
+    #  @param timeout_secs Time (in seconds) the device has to initialise,
+    #         None = no limit.
+    #  @returns True if the device initialised.
+    #  @throws concurrent.futures.TimeoutError if the device timed out.
+    @staticmethod
+    def _wait_for_device_init(future, start_times, name, timeout_secs):
+        if timeout_secs is None:
+            return future.result()
+
+        while True:
+            start_time = start_times.get(name)
+            if start_time is None:
+                remaining = timeout_secs
+
+            else:
+                remaining = start_time + timeout_secs - time.monotonic()
+
+            try:
+                return future.result(timeout=max(0.0, remaining))
+
+            except concurrent.futures.TimeoutError:
+                # Only a device that has actually started can time out.
+                if start_times.get(name) is not None and \
+                   time.monotonic() >= start_times[name] + timeout_secs:
+                    raise
+
+
+    ## Check if a running device's plug-in is still the one that its device
+    #  type would create, i.e. the plug-in class and whether it is isolated
+    #  in its own process haven't changed.
+    #  @param self The object pointer.
+    #  @param device Running device.
+    #  @param device_type Name of the device's device type.
+    #  @returns True if the plug-in is unchanged.
+    def _plugin_is_unchanged(self, device, device_type):
+        isolated = isinstance(device.deviceType, IsolatedDevice)
+        plugin_class = device.deviceType.plugin_class if isolated \
+            else type(device.deviceType)
+
+        return plugin_class is \
+            self._device_type_mgr.device_types.get(device_type) and \
+            isolated == \
+            (device_type in self._device_type_mgr.isolated_device_types)
+
+
+    ## Shut down a device that is being removed.
+    #  @param self The object pointer.
+    #  @param device Device to shut down.
+    def _teardown_device(self, device):
+        self._logger.Log(LogType.Info, "Removing device '%s'", device.name)
+
+        try:
+            device.deviceType.shutdown()
+
+        except AttributeError:
+            # Plug-ins that aren't derived from BaseDeviceType may not
+            # implement shutdown(), there is nothing to release for those.
+            pass
+
+
+    ## Start the set grace period of newly added sensors in armed zones.
+    #  @param self The object pointer.
+    #  @param devices Newly added devices.
+    #  @param armed_zones Zones that are currently armed.
+    def _arm_new_sensors(self, devices, armed_zones):
+        sensor = DevicesConfigLoader.DeviceHardwareType.Sensor
+
+        for device in devices:
+            if device.hardware != sensor or device.zone not in armed_zones:
+                continue
+
+            evt_body = {
+                'activationTimestamp': self._event_mgr.Clock.Time(),
+                'noGraceTime': False,
+                Evts.AlarmZoneBodyItem.Zone: device.zone
+            }
+
+            try:
+                device.deviceType.receive_event(
+                    Event(Evts.EvtType.AlarmActivated, evt_body))
+
+            except NotImplementedError:
+                self._logger.Log(LogType.Info,
+                                 "Device '%s' missing receive_event()",
+                                 device.name)
+
+
+    ## Look up the devices that use a pin.
+    #  @param self The object pointer.
+    #  @param pin Pin number.
+    #  @returns Tuple of devices using the pin.
+    def devices_using_pin(self, pin):
+        return self._devices_by_pin.get(pin, ())
+
+
+    ## Get the devices of a hardware type that an alarm or siren event is for,
+    #  only the devices in the event's zone or every device if the event has
+    #  no zone.
+    #  @param self The object pointer.
+    #  @param event Alarm or siren event.
+    #  @param hardware Hardware type of the devices.
+    #  @returns Tuple of devices.
+    def _devices_for_event(self, event, hardware):
+        zone = event.body.get(Evts.AlarmZoneBodyItem.Zone) \
+            if event.body else None
+
+        if zone is None:
+            return self._devices_by_hardware.get(hardware, ())
+
+        return self._devices_by_zone.get((zone, hardware), ())
+
+
+    ## Rebuild the device lookup indexes (by hardware type, zone, name and
+    #  pin), this must be called whenever the set of devices changes so that
+    #  event fan-out only visits the devices that the event is for.
+    #  @param self The object pointer.
+    def _rebuild_device_indexes(self):
+        by_hardware = {}
+        by_name = {}
+        by_pin = {}
+        by_zone = {}
+        io_pin = DevicesConfigLoader.DevicePinsElement.IoPin
+
+        for device in self._devices:
+            by_hardware.setdefault(device.hardware, []).append(device)
+            by_name[device.name] = device
+            by_zone.setdefault((device.zone, device.hardware),
+                               []).append(device)
+
+            for pin in device.pins:
+                pin_number = IoPinAddress.to_pin_number(pin[io_pin])
+                by_pin.setdefault(pin_number, []).append(device)
+
+        self._devices_by_hardware = {hw: tuple(devices)
+                                     for hw, devices in by_hardware.items()}
+        self._devices_by_name = by_name
+        self._devices_by_pin = {pin: tuple(devices)
+                                for pin, devices in by_pin.items()}
+        self._devices_by_zone = {key: tuple(devices)
+                                 for key, devices in by_zone.items()}
+
+
+    ## Check if any of a device's pins are on a GPIO expander board.
+    #  @param self The object pointer.
+    #  @param pins Pin(s) layout of the device.
+    def _uses_expander_pins(self, pins):
+        # pylint: disable=no-self-use
+        io_pin = DevicesConfigLoader.DevicePinsElement.IoPin
+        return any(IoPinAddress.is_expander_pin(
+            IoPinAddress.to_pin_number(pin[io_pin])) for pin in pins)
+
+
+    ## Tell the devices watching a pin that its state has changed.
+    #  @param self The object pointer.
+    #  @param pin Pin number that has changed.
+    #  @param state New state of the pin.
+    def _notify_pin_state_changed(self, pin, state):
+        for device in self._edge_devices.get(pin, ()):
+            debounce_filter = self._debounce_filters.get((device.name, pin))
+
+            if debounce_filter is None:
+                self._call_pin_state_changed(device, pin, state)
+
+            else:
+                self._update_debounce_filter(device, pin, debounce_filter,
+                                             state)
+
+
+    ## Pass a pin sample through a device's debounce filter, the device is
+    #  only told about the pin once it has settled into a new state.
+    #  @param self The object pointer.
+    #  @param device Device the filter belongs to.
+    #  @param pin Pin number.
+    #  @param debounce_filter Debounce filter instance.
+    #  @param state Sampled state of the pin.
+    def _update_debounce_filter(self, device, pin, debounce_filter, state):
+        key = (device.name, pin)
+        self._filters_updated.add(key)
+
+        now = self._event_mgr.Clock.Monotonic()
+        settled_state = debounce_filter.update(state, now)
+        if settled_state is not None:
+            self._call_pin_state_changed(device, pin, settled_state)
+
+        # A filter that hasn't settled needs sampling on each scan, even if
+        # the pin doesn't change again.
+        if debounce_filter.is_settling:
+            self._settling_filters[key] = (device, pin, debounce_filter)
+
+        else:
+            self._settling_filters.pop(key, None)
+
+
+    ## Sample the pins of the debounce filters that haven't settled yet, any
+    #  filter already updated during this scan is skipped.
+    #  @param self The object pointer.
+    def _sample_settling_filters(self):
+        for key, (device, pin, debounce_filter) in \
+                list(self._settling_filters.items()):
+            if key not in self._filters_updated:
+                self._update_debounce_filter(device, pin, debounce_filter,
+                                             GPIO.input(pin))
+
+
+    ## Call a device's pin_state_changed().
+    #  @param self The object pointer.
+    #  @param device Device to call.
+    #  @param pin Pin number that has changed.
+    #  @param state New state of the pin.
+    def _call_pin_state_changed(self, device, pin, state):
+        try:
+            device.deviceType.pin_state_changed(pin, state)
+
+        except NotImplementedError:
+            self._logger.Log(LogType.Error,
+                             "Device name '%s' plug-in does not " + \
+                             "implement pin_state_changed()",
+                             device.name)
+
+
+    ## Set up edge detection for the pins that devices want to be notified
+    #  about, devices that don't use edge detection are polled instead.  When
+    #  emulated the pins are bulk sampled on each scan (see sample_pins())
+    #  rather than each edge being raised as an event.
+    #  @param self The object pointer.
+    def _setup_edge_detection(self):
+        old_edge_devices = self._edge_devices
+        old_filters = self._debounce_filters
+
+        self._debounce_filters = {}
+        self._edge_devices = {}
+        self._isolated_devices = [
+            device for device in self._devices
+            if isinstance(device.deviceType, IsolatedDevice)]
+        self._polled_devices = []
+        self._watched_pin_mask = 0
+
+        for device in self._devices:
+            pins = device.deviceType.edge_detect_pins()
+
+            if not pins:
+                self._polled_devices.append(device)
+                continue
+
+            for pin in pins:
+                if pin not in self._edge_devices:
+                    self._edge_devices[pin] = []
+                    self._watched_pin_mask |= 1 << (pin * 8)
+
+                    if not RPIO_EMULATED and pin not in old_edge_devices:
+                        GPIO.add_event_detect(pin, GPIO.BOTH,
+                                              callback=self._pin_edge_detected)
+
+                self._edge_devices[pin].append(device)
+
+                # A device that is still running (e.g. after a reload) keeps
+                # its filter, so a pin that is part way through settling
+                # isn't reset.
+                key = (device.name, pin)
+                debounce_filter = old_filters.get(key)
+                if not any(old is device
+                           for old in old_edge_devices.get(pin, ())):
+                    debounce_filter = create_debounce_filter(device.debounce,
+                                                             GPIO.input(pin))
+                if debounce_filter is not None:
+                    self._debounce_filters[key] = debounce_filter
+
+        self._settling_filters = {
+            key: entry for key, entry in self._settling_filters.items()
+            if self._debounce_filters.get(key) is entry[2]}
+
+        if not RPIO_EMULATED:
+            for pin in set(old_edge_devices) - set(self._edge_devices):
+                GPIO.remove_event_detect(pin)
+
+        if RPIO_EMULATED and self._pin_sample is None:
+            self._pin_sample = self._read_pin_sample()
+
+
+    ## Bulk read the emulated pins, normalising each pin to a 0 or 1 level so
+    #  that only real changes of level are seen as changes and plug-ins are
+    #  always given 0 or 1.
+    #  @param self The object pointer.
+    #  @returns Pin sample with a byte per pin.
+    def _read_pin_sample(self):
+        return GPIO.sample_pins().translate(self.PinLevels)
+
+
+    ## Set up edge detection again after plug-ins hosted in their own process
+    #  have restarted, as the pins they watch may have changed, then tell them
+    #  the current state of those pins as any edges whilst they were
+    #  restarting were lost.
+    #  @param self The object pointer.
+    #  @param devices Devices whose plug-ins have restarted.
+    def _refresh_restarted_devices(self, devices):
+        self._setup_edge_detection()
+
+        for device in devices:
+            for pin in device.deviceType.edge_detect_pins():
+                self._call_pin_state_changed(device, pin, GPIO.input(pin))
+
+
+    ## Edge detection callback, this can be called from a GPIO library thread
+    #  so the edge is passed to the worker thread as an event.
+    #  @param self The object pointer.
+    #  @param channel Pin number that the edge was detected on.
+    def _pin_edge_detected(self, channel):
+        evt_body = {Evts.DevicePinEdgeBodyItem.Pin: channel}
+        self._event_mgr.QueueEvent(Event(Evts.EvtType.DevicePinEdge, evt_body))
@@ -17,17 +17,20 @@ import collections
 import re
 import json
 import importlib
+import importlib.metadata
 import jsonschema
 from central_controller.DeviceTypes.base_device_type import BaseDeviceType
 from common.Logger import LogType
+from common.SchemaValidators import Validate
 
 
 class DeviceTypeManager:
     # pylint: disable=R0903
-    __slots__ = ['_device_types', '_expected_types', '_logger',
-                 '_last_error_msg']
+    __slots__ = ['_device_types', '_expected_types', '_isolated_types',
+                 '_logger', '_last_error_msg']
 
-    DeviceTypeCfg = collections.namedtuple('DeviceTypeCfg', 'name enabled')
+    DeviceTypeCfg = collections.namedtuple('DeviceTypeCfg',
+                                           'name enabled isolated')
 
     # Json devices array element.
     JsonDeviceTypesArray = 'deviceTypes'
@@ -37,6 +40,21 @@ class DeviceTypeManager:
 
     JsonDeviceTypeElement_Name = 'name'
     JsonDeviceTypeElement_Enabled = 'enabled'
+    JsonDeviceTypeElement_Isolated = 'isolated'
+
+    ## Package containing the built-in device type plug-ins.
+    DefaultModulePath = 'central_controller.DeviceTypes.'
+
+    ## Entry point group that installed packages can register device type
+    #  plug-ins under, the entry point name is the device type name.
+    EntryPointGroup = 'secureshed.device_types'
+
+    ## Plug-in classes that have been resolved, device type name => class.
+    #  Shared by all instances so a reload doesn't look them up again.
+    _resolved_classes = {}
+
+    ## Registered plug-in entry points, looked up on first use.
+    _entry_points = None
 
     ## Device types configuration file's Json schema.
     JsonSchema = \
@@ -55,6 +73,10 @@ class DeviceTypeManager:
                         "type": "string"
                     },
                     JsonDeviceTypeElement_Enabled:
+                    {
+                        "type": "boolean"
+                    },
+                    JsonDeviceTypeElement_Isolated:
                     {
                         "type": "boolean"
                     }
@@ -84,6 +106,12 @@ class DeviceTypeManager:
     def device_types(self):
         return self._device_types
 
+    ## Property getter : Names of the device types whose plug-ins are hosted
+    #  in their own process (see IsolatedDevice).
+    @property
+    def isolated_device_types(self):
+        return self._isolated_types
+
     @property
     def last_error_msg(self):
         return self._last_error_msg
@@ -95,6 +123,8 @@ class DeviceTypeManager:
 
         self._device_types = {}
 
+        self._isolated_types = set()
+
         self._last_error_msg = ''
 
         self._logger = logger
@@ -103,6 +133,7 @@ class DeviceTypeManager:
     #  @param self The object pointer.
     def read_device_types_config(self, filename):
         self._last_error_msg = ''
+        self._expected_types = []
 
         try:
             with open(filename) as file_handle:
@@ -122,8 +153,7 @@ class DeviceTypeManager:
             return False
 
         try:
-            jsonschema.validate(instance=config_json,
-                                schema=self.JsonSchema)
+            Validate(config_json, self.JsonSchema)
 
         except jsonschema.exceptions.SchemaError:
             self._last_error_msg = "FATAL internal error, schema file invalid!"
@@ -138,7 +168,9 @@ class DeviceTypeManager:
         for device_type in config_json[self.JsonDeviceTypesArray]:
             device_type_entry = self.DeviceTypeCfg(
                 name=device_type[self.JsonDeviceTypeElement_Name],
-                enabled=device_type[self.JsonDeviceTypeElement_Enabled])
+                enabled=device_type[self.JsonDeviceTypeElement_Enabled],
+                isolated=device_type.get(self.JsonDeviceTypeElement_Isolated,
+                                         False))
             self._logger.Log(LogType.Info,
                              f"Loading device name: {device_type[self.JsonDeviceTypeElement_Name]}")
             self._expected_types.append(device_type_entry)
@@ -146,55 +178,128 @@ class DeviceTypeManager:
         return True
 
 
+    ## Load the plug-ins for the enabled device types.  If the device types
+    #  that are in use are given then only those are loaded, so types that
+    #  no device uses are never imported.
     #  @param self The object pointer.
-    def load_device_types(self):
-        default_module_path = 'central_controller.DeviceTypes.'
+    #  @param required_types Names of the device types in use, None = all.
+    def load_device_types(self, required_types=None):
+        # Start afresh so that reloading the configuration drops any device
+        # types that have been removed or disabled.
+        self._device_types = {}
+        self._isolated_types = set()
 
         for device in self._expected_types:
             device_name = device.name
 
+            if required_types is not None and \
+               device_name not in required_types:
+                continue
+
             if not device.enabled:
                 msg = f"Plug-in for device type '{device_name}' is disabled" +\
                        " so loading won't be attempted."
                 self._logger.Log(LogType.Warn, msg)
                 continue
 
-            # The module names are in camel case so do conversion before
-            # building the module name.
-            device_name_camel = re.sub(r'(?<!^)(?=[A-Z])', '_',
-                                       device_name).lower()
-            module_name = f'{default_module_path}{device_name_camel}'
+            imported_cls = self._resolve_device_type(device_name)
+            if imported_cls is None:
+                continue
+
+            self._device_types[device_name] = imported_cls
 
-            try:
-                imported_module = importlib.import_module(module_name)
+            if device.isolated:
+                self._isolated_types.add(device_name)
 
-            except ModuleNotFoundError:
-                self._logger.Log(LogType.Warn,
-                                 f"No plug-in for device type '{device_name}'," +\
-                                 " it has been removed from the devices list.")
-                continue
+            self._logger.Log(LogType.Info,
+                             f"Loaded plug-in for device type '{device_name}'")
 
-            except NameError:
-                self._logger.Log(LogType.Warn,
-                                 f"Device type '{device_name}' Plug-in has a " +\
-                                 "syntax error, it has been removed from the devices list.")
-                continue
 
-            try:
-                imported_cls = getattr(imported_module, device_name, self._logger)
+    ## Find the plug-in class for a device type, resolved classes are cached
+    #  so each device type is only looked up once.  A plug-in registered
+    #  through the package entry point group takes precedence over a module
+    #  in the DeviceTypes package.
+    #  @param self The object pointer.
+    #  @param device_name Name of the device type.
+    #  @returns Plug-in class or None if there isn't a valid plug-in.
+    def _resolve_device_type(self, device_name):
+        imported_cls = self._resolved_classes.get(device_name)
+        if imported_cls is not None:
+            return imported_cls
+
+        entry_point = self._plugin_entry_points().get(device_name)
 
-                valid = BaseDeviceType in imported_cls.__bases__
+        try:
+            if entry_point is not None:
+                imported_cls = entry_point.load()
+
+            else:
+                imported_cls = self._import_device_type_module(device_name)
+
+        except ModuleNotFoundError:
+            self._logger.Log(LogType.Warn,
+                             f"No plug-in for device type '{device_name}'," +\
+                             " it has been removed from the devices list.")
+            return None
+
+        except (NameError, SyntaxError):
+            self._logger.Log(LogType.Warn,
+                             f"Device type '{device_name}' Plug-in has a " +\
+                             "syntax error, it has been removed from the devices list.")
+            return None
+
+        except AttributeError:
+            self._logger.Log(LogType.Warn,
+                             f"Plug-in for device type '{device_name}' " +\
+                             "doesn't define the device type's class, it " +\
+                             "has been removed from the devices list.")
+            return None
+
+        valid = BaseDeviceType in getattr(imported_cls, '__bases__', ())
+
+        if not valid:
+            self._logger.Log(LogType.Warn,
+                             f"Plug-in for device type '{device_name}'" +\
+                             " is not derived from plug-in class.  It cannot be " +\
+                             "used and was removed from the devices list.")
+            return None
+
+        self._resolved_classes[device_name] = imported_cls
+        return imported_cls
+
+
+    ## Import a device type's class from its module in the DeviceTypes
+    #  package.
+    #  @param self The object pointer.
+    #  @param device_name Name of the device type.
+    #  @returns Plug-in class.
+    def _import_device_type_module(self, device_name):
+        # The module names are in camel case so do conversion before
+        # building the module name.
+        device_name_camel = re.sub(r'(?<!^)(?=[A-Z])', '_',
+                                   device_name).lower()
+        module_name = f'{self.DefaultModulePath}{device_name_camel}'
+
+        imported_module = importlib.import_module(module_name)
+        return getattr(imported_module, device_name)
+
+
+    ## Get the device type plug-ins registered by installed packages, the
+    #  entry points are only looked up once.
+    #  @param self The object pointer.
+    #  @returns Dictionary of device type name => entry point.
+    @classmethod
+    def _plugin_entry_points(cls):
+        if cls._entry_points is None:
+            try:
+                entry_points = importlib.metadata.entry_points(
+                    group=cls.EntryPointGroup)
 
-                if not valid:
-                    self._logger.Log(LogType.Warn,
-                                     f"Plug-in for device type '{device_name}'" +\
-                                     " is not derived from plug-in class.  It cannot be " +\
-                                     "used and was removed from the devices list.")
-                    continue
+            except TypeError:
+                # Python < 3.10 returns a dictionary of groups.
+                entry_points = importlib.metadata.entry_points().get(
+                    cls.EntryPointGroup, [])
 
-                self._device_types[device_name] = imported_cls
-                self._logger.Log(LogType.Info,
-                                 f"Loaded plug-in for device type '{device_name}'")
+            cls._entry_points = {entry.name: entry for entry in entry_points}
 
-            except AttributeError:
-                pass
+        return cls._entry_points
@@ -15,7 +15,7 @@ limitations under the License.
 '''
 # pylint: disable=R0903
 from common.json_enabled_class import JsonLoadingClass
-from central_controller.emulated_raspberry_pi_io import GPIO
+from central_controller.io_pin_address import IoPinAddress
 
 
 class DevicesConfigLoader(JsonLoadingClass):
@@ -31,15 +31,24 @@ class DevicesConfigLoader(JsonLoadingClass):
         Pins = 'pins'
         Enabled = 'enabled'
         TriggerGracePeriodSecs = 'triggerGracePeriodSecs'
+        Debounce = 'debounce'
+        Zone = 'zone'
 
     class DevicePinsElement:
         IoPin = 'ioPin'
         Identifier = 'identifier'
 
+    class DebounceElement:
+        StableMs = 'stableMs'
+        MajoritySamples = 'majoritySamples'
+
     class DeviceHardwareType:
         Sensor = 'sensor'
         Siren = 'siren'
 
+    ## Zone that a device is in if it doesn't specify one.
+    DefaultZone = 'default'
+
     ## Configuration file's Json schema.
     JsonSchema = \
     {
@@ -55,17 +64,7 @@ class DevicesConfigLoader(JsonLoadingClass):
                     DevicePinsElement.IoPin:
                     {
                         "type": "string",
-                        "enum":
-                        [
-                            GPIO.PinEntryGPIO05Element,
-                            GPIO.PinEntryGPIO06Element,
-                            GPIO.PinEntryGPIO14Element,
-                            GPIO.PinEntryGPIO15Element,
-                            GPIO.PinEntryGPIO18Element,
-                            GPIO.PinEntryGPIO23Element,
-                            GPIO.PinEntryGPIO24Element,
-                            GPIO.PinEntryGPIO25Element
-                        ]
+                        "pattern": IoPinAddress.PinIdPattern
                     },
                     DevicePinsElement.Identifier:
                     {
@@ -79,6 +78,26 @@ class DevicesConfigLoader(JsonLoadingClass):
                     DevicePinsElement.Identifier
                 ]
             },
+            DeviceElement.Debounce:
+            {
+                "type" : "object",
+                "properties":
+                {
+                    DebounceElement.StableMs:
+                    {
+                        "type": "integer",
+                        "minimum": 1
+                    },
+                    DebounceElement.MajoritySamples:
+                    {
+                        "type": "integer",
+                        "minimum": 3
+                    }
+                },
+                "additionalProperties": False,
+                "minProperties": 1,
+                "maxProperties": 1
+            },
             JsonTopElement.Device:
             {
                 "type" : "object",
@@ -114,6 +133,15 @@ class DevicesConfigLoader(JsonLoadingClass):
                     {
                         "type": "integer",
                         "minimum": 1
+                    },
+                    DeviceElement.Debounce:
+                    {
+                        "$ref": f"#/definitions/{DeviceElement.Debounce}"
+                    },
+                    DeviceElement.Zone:
+                    {
+                        "type": "string",
+                        "minLength": 1
                     }
                 },
                 "additionalProperties": False,
@@ -161,3 +189,14 @@ class DevicesConfigLoader(JsonLoadingClass):
             return None
 
         return data
+
+
+    ## Get the device types used by the enabled devices, so only their
+    #  plug-ins need loading.
+    #  @param devices Devices configuration (the devices.json devices array).
+    #  @returns Set of device type names.
+    @staticmethod
+    def device_types_in_use(devices):
+        return {device[DevicesConfigLoader.DeviceElement.DeviceType]
+                for device in devices
+                if device[DevicesConfigLoader.DeviceElement.Enabled]}
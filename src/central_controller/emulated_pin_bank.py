@@ -0,0 +1,165 @@
+'''
+Copyright 2019 Secure Shed Project Dev Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+import mmap
+import os
+
+
+## Emulated bank of IO pins held in process memory.  The layout is one byte
+#  per pin indexed by the pin number where 0 is low and 1 is high, pins are
+#  high by default (as they would be with a pull-up).  The bank grows as
+#  higher pin numbers are needed.
+class MemoryPinBank:
+    __slots__ = ['_memory']
+
+    ## Default number of pins in the bank, enough for all of the Raspberry Pi
+    #  BCM GPIO numbers.
+    DefaultPinCount = 64
+
+    ## Property getter : Number of pins in the bank.
+    @property
+    def pin_count(self):
+        return len(self._memory)
+
+
+    ## MemoryPinBank class constructor.
+    #  @param self The object pointer.
+    #  @param pin_count Initial number of pins in the bank.
+    def __init__(self, pin_count=DefaultPinCount):
+        self._memory = bytearray(b'\x01' * pin_count)
+
+
+    ## Read the state of a pin.
+    #  @param self The object pointer.
+    #  @param pin Pin number.
+    #  @returns 1 if the pin is high, otherwise 0.
+    def read(self, pin):
+        return self._memory[pin]
+
+
+    ## Write the state of a pin.
+    #  @param self The object pointer.
+    #  @param pin Pin number.
+    #  @param state 1 for high, 0 for low.
+    def write(self, pin, state):
+        self._memory[pin] = 1 if state else 0
+
+
+    ## Take a copy of the state of all of the pins.
+    #  @param self The object pointer.
+    #  @returns Bytes object with one byte per pin.
+    def snapshot(self):
+        return bytes(self._memory)
+
+
+    ## Make sure the bank has at least the given number of pins, any new pins
+    #  are high.
+    #  @param self The object pointer.
+    #  @param pin_count Minimum number of pins.
+    def ensure_capacity(self, pin_count):
+        if pin_count > len(self._memory):
+            self._memory.extend(b'\x01' * (pin_count - len(self._memory)))
+
+
+    ## Release the bank, nothing to do for process memory.
+    #  @param self The object pointer.
+    def close(self):
+        pass
+
+
+## Emulated bank of IO pins shared with other processes through a memory
+#  mapped file.  The layout is the same as MemoryPinBank, so a test harness
+#  can change a pin by writing a single byte to the file (or its own mapping
+#  of it) without any parsing on either side.
+class SharedMemoryPinBank:
+    __slots__ = ['_file_handle', '_memory', '_pin_count']
+
+    ## Default number of pins in the bank.
+    DefaultPinCount = MemoryPinBank.DefaultPinCount
+
+    ## Property getter : Number of pins in the bank.
+    @property
+    def pin_count(self):
+        return self._pin_count
+
+
+    ## SharedMemoryPinBank class constructor, the backing file is created (with
+    #  all pins high) if it doesn't exist or is too small.
+    #  @param self The object pointer.
+    #  @param filename Backing file for the shared memory.
+    #  @param pin_count Number of pins in the bank.
+    def __init__(self, filename, pin_count=DefaultPinCount):
+        file_flags = os.O_RDWR | os.O_CREAT
+        file_desc = os.open(filename, file_flags, 0o644)
+        self._file_handle = os.fdopen(file_desc, 'r+b')
+        self._memory = None
+        self._pin_count = 0
+
+        # If the file already holds more pins than asked for, map them all.
+        current_size = os.fstat(file_desc).st_size
+        self.ensure_capacity(max(pin_count, current_size))
+
+
+    ## Read the state of a pin.
+    #  @param self The object pointer.
+    #  @param pin Pin number.
+    #  @returns 1 if the pin is high, otherwise 0.
+    def read(self, pin):
+        return self._memory[pin]
+
+
+    ## Write the state of a pin.
+    #  @param self The object pointer.
+    #  @param pin Pin number.
+    #  @param state 1 for high, 0 for low.
+    def write(self, pin, state):
+        self._memory[pin] = 1 if state else 0
+
+
+    ## Take a copy of the state of all of the pins.
+    #  @param self The object pointer.
+    #  @returns Bytes object with one byte per pin.
+    def snapshot(self):
+        return self._memory[:]
+
+
+    ## Make sure the bank has at least the given number of pins, the backing
+    #  file is extended (new pins are high) and remapped if needed.
+    #  @param self The object pointer.
+    #  @param pin_count Minimum number of pins.
+    def ensure_capacity(self, pin_count):
+        if pin_count <= self._pin_count:
+            return
+
+        file_desc = self._file_handle.fileno()
+        current_size = os.fstat(file_desc).st_size
+
+        if current_size < pin_count:
+            self._file_handle.seek(current_size)
+            self._file_handle.write(b'\x01' * (pin_count - current_size))
+            self._file_handle.flush()
+
+        if self._memory is not None:
+            self._memory.close()
+
+        self._memory = mmap.mmap(file_desc, pin_count)
+        self._pin_count = pin_count
+
+
+    ## Unmap the shared memory and close the backing file.
+    #  @param self The object pointer.
+    def close(self):
+        self._memory.close()
+        self._file_handle.close()
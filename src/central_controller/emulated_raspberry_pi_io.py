@@ -14,13 +14,21 @@ See the License for the specific language governing permissions and
 limitations under the License.
 '''
 import enum
-import hashlib
 import json
+import threading
 import jsonschema
+from central_controller.emulated_pin_bank import (MemoryPinBank,
+                                                  SharedMemoryPinBank)
+from central_controller.file_change_detector import FileChangeDetector
+from central_controller.io_pin_address import IoPinAddress
 from common.Logger import LogType
+from common.SchemaValidators import Validate
 
 
-## Simulation of the Raspberry GPIO package.
+## Simulation of the Raspberry GPIO package.  The emulated pin space isn't
+#  limited to the Raspberry Pi's own header, any pin that can be addressed by
+#  IoPinAddress (including GPIO expander pins) can be used and the pin bank
+#  grows to fit.
 class GPIO:
 
     ## Enumerated of the state of a pin.
@@ -31,37 +39,6 @@ class GPIO:
         ## Pin is in high state.
         High = 1
 
-    # |============================|
-    # | Pin out file json elements |
-    # |============================|
-
-    ## Pin entry Prefix.
-    PinEntryGPIOPrefix = 'GPIO'
-
-    ## Pin entry: GPIO05.
-    PinEntryGPIO05Element = f'{PinEntryGPIOPrefix}05'
-
-    ## Pin entry: GPIO06.
-    PinEntryGPIO06Element = f'{PinEntryGPIOPrefix}06'
-
-    ## Pin entry: GPIO14.
-    PinEntryGPIO14Element = f'{PinEntryGPIOPrefix}14'
-
-    ## Pin entry: GPIO15.
-    PinEntryGPIO15Element = f'{PinEntryGPIOPrefix}15'
-
-    ## Pin entry: GPIO18.
-    PinEntryGPIO18Element = f'{PinEntryGPIOPrefix}18'
-
-    ## Pin entry: GPIO23.
-    PinEntryGPIO23Element = f'{PinEntryGPIOPrefix}23'
-
-    ## Pin entry: GPIO24.
-    PinEntryGPIO24Element = f'{PinEntryGPIOPrefix}24'
-
-    ## Pin entry: GPIO25.
-    PinEntryGPIO25Element = f'{PinEntryGPIOPrefix}25'
-
     # |========================|
     # | IO pin object elements |
     # |========================|
@@ -78,7 +55,8 @@ class GPIO:
     ## IO pin state constant : Low.
     IOPinStateElement_Low = 'low'
 
-    ## Definition of the pinout json file's schema to validate against.
+    ## Definition of the pinout json file's schema to validate against, the
+    #  file only needs to list the pins that it sets.
     PinOutJsonFileSchema = {
         "$schema": "http://json-schema.org/draft-07/schema#",
         "definitions":
@@ -103,51 +81,33 @@ class GPIO:
             }
         },
         "type": "object",
-        "properties":
+        "patternProperties":
         {
-            PinEntryGPIO05Element: {"$ref": f"#/definitions/{IOPinElement}"},
-            PinEntryGPIO06Element: {"$ref": f"#/definitions/{IOPinElement}"},
-            PinEntryGPIO14Element: {"$ref": f"#/definitions/{IOPinElement}"},
-            PinEntryGPIO15Element: {"$ref": f"#/definitions/{IOPinElement}"},
-            PinEntryGPIO18Element: {"$ref": f"#/definitions/{IOPinElement}"},
-            PinEntryGPIO23Element: {"$ref": f"#/definitions/{IOPinElement}"},
-            PinEntryGPIO24Element: {"$ref": f"#/definitions/{IOPinElement}"},
-            PinEntryGPIO25Element: {"$ref": f"#/definitions/{IOPinElement}"}
+            IoPinAddress.PinIdPattern: {"$ref": f"#/definitions/{IOPinElement}"}
         },
-        "required":
-        [
-            PinEntryGPIO05Element,
-            PinEntryGPIO06Element,
-            PinEntryGPIO14Element,
-            PinEntryGPIO15Element,
-            PinEntryGPIO18Element,
-            PinEntryGPIO23Element,
-            PinEntryGPIO24Element,
-            PinEntryGPIO25Element
-        ],
         "additionalProperties": False
     }
 
     ## The current simulated state of the IO pins.
-    CurrentPinOutStates = {
-        PinEntryGPIO05Element : PinState.High,
-        PinEntryGPIO06Element : PinState.High,
-        PinEntryGPIO14Element : PinState.High,
-        PinEntryGPIO15Element : PinState.High,
-        PinEntryGPIO18Element : PinState.High,
-        PinEntryGPIO23Element : PinState.High,
-        PinEntryGPIO24Element : PinState.High,
-        PinEntryGPIO25Element : PinState.High
-    }
+    PinBank = MemoryPinBank()
+
+    ## Snapshot of the pin bank when edges were last checked for.
+    PinBankSnapshot = PinBank.snapshot()
 
     logger = None
 
-    ## Last MD5 for the pinout file.
-    PinOutFileHash = None
+    ## Change detector for the pinout file, created on first use.
+    PinOutFileChangeDetector = None
 
     ## File and location of the pin out file.
     PinOutFile = 'centralController/pinOutFile.json'
 
+    ## True if the pin bank is shared memory, rather than the pinout file.
+    UsingSharedPinBank = False
+
+    ## Serialises growing the pin bank, devices may be set up concurrently.
+    PinBankLock = threading.Lock()
+
 
     ##################################
     # -- RPi.GPIO numbering systems --
@@ -182,23 +142,114 @@ class GPIO:
 
     PUD_UP = 401
 
+    ##############################
+    # -- RPi.GPIO edge types --
+    ##############################
+
+    ## RPi.GPIO edge type : Rising (low to high).
+    RISING = 31
+
+    ## RPi.GPIO edge type : Falling (high to low).
+    FALLING = 32
+
+    ## RPi.GPIO edge type : Both rising and falling.
+    BOTH = 33
+
+    ## Edge detection registered for each pin, pin => [edge, [callbacks]].
+    EdgeDetection = {}
+
 
     ## Simulated version of the Raspberry Pi GPIO cleanup() function for
-    #  testing purposes.
-    #  Note: This method is currently empty as nothing needs simualting.
+    #  testing purposes, this removes any edge detection.
     @staticmethod
     def cleanup():
         # pylint: disable=C0103
-        pass
+        GPIO.EdgeDetection = {}
+
+        if GPIO.UsingSharedPinBank:
+            GPIO.PinBank.close()
+            GPIO.PinBank = MemoryPinBank()
+            GPIO.PinBankSnapshot = GPIO.PinBank.snapshot()
+            GPIO.UsingSharedPinBank = False
+
+
+    ## Switch the emulation to use a shared memory pin bank instead of the
+    #  pinout json file, see SharedMemoryPinBank for the layout.
+    #  @param filename Backing file for the shared memory.
+    @staticmethod
+    def use_shared_memory_pin_bank(filename):
+        pin_count = GPIO.PinBank.pin_count
+        GPIO.PinBank = SharedMemoryPinBank(filename, pin_count)
+        GPIO.PinBankSnapshot = GPIO.PinBank.snapshot()
+        GPIO.UsingSharedPinBank = True
+
+
+    ## Make sure the emulated pin bank can hold the given pin.
+    #  @param pin Pin number.
+    @staticmethod
+    def ensure_pin_exists(pin):
+        if pin < GPIO.PinBank.pin_count:
+            return
+
+        with GPIO.PinBankLock:
+            if pin < GPIO.PinBank.pin_count:
+                return
+
+            GPIO.PinBank.ensure_capacity(pin + 1)
+            GPIO.PinBankSnapshot = GPIO.PinBank.snapshot()
 
 
     ## Simulated version of the Raspberry Pi GPIO setup() function for
-    #  testing purposes.
-    #  Note: This method is currently empty as nothing needs simualting.
+    #  testing purposes, this makes sure the pin exists in the pin bank.
     @staticmethod
     def setup(pin, state, pull_up_down=None):
         # pylint: disable=C0103
-        pass
+        # pylint: disable=unused-argument
+        GPIO.ensure_pin_exists(pin)
+
+
+    ## Simulated version of the Raspberry Pi GPIO add_event_detect() function,
+    #  callbacks are made when a pin changes state in the pin bank.
+    #  @param channel Pin to detect edges on.
+    #  @param edge Edge type: RISING, FALLING or BOTH.
+    #  @param callback Optional callback, called with the pin number.
+    #  @param bouncetime Unused, switch bounce isn't simulated.
+    @staticmethod
+    def add_event_detect(channel, edge, callback=None, bouncetime=None):
+        # pylint: disable=C0103
+        # pylint: disable=unused-argument
+        if channel in GPIO.EdgeDetection:
+            raise RuntimeError('Conflicting edge detection already enabled ' +
+                               f'for GPIO channel {channel}')
+
+        GPIO.ensure_pin_exists(channel)
+        GPIO.EdgeDetection[channel] = [edge, []]
+
+        if callback is not None:
+            GPIO.add_event_callback(channel, callback)
+
+
+    ## Simulated version of the Raspberry Pi GPIO add_event_callback()
+    #  function.
+    #  @param channel Pin to add the callback to.
+    #  @param callback Callback, called with the pin number.
+    @staticmethod
+    def add_event_callback(channel, callback):
+        # pylint: disable=C0103
+        if channel not in GPIO.EdgeDetection:
+            raise RuntimeError('Add event detection using add_event_detect ' +
+                               'first before adding a callback')
+
+        GPIO.EdgeDetection[channel][1].append(callback)
+
+
+    ## Simulated version of the Raspberry Pi GPIO remove_event_detect()
+    #  function.
+    #  @param channel Pin to stop detecting edges on.
+    @staticmethod
+    def remove_event_detect(channel):
+        # pylint: disable=C0103
+        GPIO.EdgeDetection.pop(channel, None)
 
 
     ## Simulated version of the Raspberry Pi GPIO setmode() function for
@@ -216,8 +267,7 @@ class GPIO:
     @staticmethod
     def input(pin):
         # pylint: disable=C0103
-        pinId = f'{GPIO.PinEntryGPIOPrefix}{pin}'
-        return GPIO.CurrentPinOutStates[pinId].value
+        return GPIO.PinBank.read(pin)
 
 
     ## Simulation of the Raspberry Pi GPIO output() function for testing
@@ -225,25 +275,59 @@ class GPIO:
     @staticmethod
     def output(pin, state):
         # pylint: disable=C0103
+        GPIO.ensure_pin_exists(pin)
+        GPIO.PinBank.write(pin, state)
+        GPIO.detect_edges()
 
-        pinId = f'{GPIO.PinEntryGPIOPrefix}{pin}'
-        new_value = GPIO.PinState.High if state == 1 else GPIO.PinState.Low
-        GPIO.CurrentPinOutStates[pinId] = new_value
+
+    ## Read the state of every pin in one go, this is much cheaper than an
+    #  input() call per pin when scanning a large number of devices.
+    #  @returns Bytes object with one byte per pin (0 = low, 1 = high).
+    @staticmethod
+    def sample_pins():
+        return GPIO.PinBank.snapshot()
 
 
-    ## Generate a MD5 hash of the pinout state file, this is to allow the file
-    #  to be checked to see if has changed between last checks.
-    #  of the Raspberry Pi GPIO output() function for testing
-    #  @returns MD5 hash if the file was hashed correctly, otherwise None.
+    ## Compare the pin bank against the snapshot from the last check and call
+    #  any edge detection callbacks registered for the pins that have changed.
     @staticmethod
-    def hash_pinout_file(pinout_file):
-        try:
-            with open(pinout_file, 'rb') as file_handle:
-                file_contents = file_handle.read()
-                return hashlib.md5(file_contents).hexdigest()
+    def detect_edges():
+        snapshot = GPIO.PinBank.snapshot()
+        if snapshot == GPIO.PinBankSnapshot:
+            return
 
-        except IOError:
-            return None
+        old_snapshot = GPIO.PinBankSnapshot
+        GPIO.PinBankSnapshot = snapshot
+
+        for pin, (old_value, new_value) in enumerate(zip(old_snapshot,
+                                                         snapshot)):
+            # Any truthy value is a high pin, so normalise before comparing
+            # and converting it to a PinState.
+            if bool(old_value) != bool(new_value):
+                GPIO.fire_edge_callbacks(pin,
+                                         GPIO.PinState(1 if new_value else 0))
+
+
+    ## Call any edge detection callbacks registered for a pin that has changed
+    #  state.
+    #  @param pin Pin that has changed state.
+    #  @param new_value New state of the pin (PinState).
+    @staticmethod
+    def fire_edge_callbacks(pin, new_value):
+        detection = GPIO.EdgeDetection.get(pin)
+        if detection is None:
+            return
+
+        edge, callbacks = detection
+
+        if edge == GPIO.RISING and new_value != GPIO.PinState.High:
+            return
+
+        if edge == GPIO.FALLING and new_value != GPIO.PinState.Low:
+            return
+
+        for callback in callbacks:
+            callback(pin)
 
 
     ## Read the json contents of the simulated pinout file and return it along
@@ -269,8 +353,7 @@ class GPIO:
                     None)
 
         try:
-            jsonschema.validate(instance=read_json,
-                                schema=GPIO.PinOutJsonFileSchema)
+            Validate(read_json, GPIO.PinOutJsonFileSchema)
 
         except jsonschema.exceptions.ValidationError as ex:
             return (f"File Schema validation failed, Reason: {ex}", None)
@@ -281,17 +364,29 @@ class GPIO:
         return ('', read_json)
 
 
+    ## Update the simulated states of the Raspberry Pi GPIO pins from whichever
+    #  emulation backend is in use, then simulate edge detection for the pins
+    #  that have changed.
+    @staticmethod
+    def update_emulated_pins():
+        if not GPIO.UsingSharedPinBank:
+            GPIO.update_from_pinout_file()
+
+        GPIO.detect_edges()
+
+
     ## Update the simulated states of the Raspberry Pi GPIO pins only if the
-    #  MD5 hash of the file has changed.
+    #  pinout file has changed.  The change check is a stat() of the file (or
+    #  nothing at all when inotify is available) so idle emulation is cheap,
+    #  the file is only hashed and parsed when it really changes.  Pins that
+    #  aren't in the file keep their current state.
     @staticmethod
     def update_from_pinout_file():
-        new_hash = GPIO.hash_pinout_file(GPIO.PinOutFile)
-        if new_hash is None or new_hash == GPIO.PinOutFileHash:
-            return
+        if GPIO.PinOutFileChangeDetector is None:
+            GPIO.PinOutFileChangeDetector = FileChangeDetector(GPIO.PinOutFile)
 
-        GPIO.PinOutFileHash = new_hash
-
-        new_pinout_states = {}
+        if not GPIO.PinOutFileChangeDetector.has_changed():
+            return
 
         status, pinouts = GPIO.read_pinout_file()
         if status or not pinouts:
@@ -300,11 +395,10 @@ class GPIO:
             return
 
         for key in pinouts:
+            pin = IoPinAddress.to_pin_number(key)
             pin_state = pinouts[key][GPIO.IOPinElement_State]
-            new_pinout_states[key] = GPIO.PinState.High \
-                if pin_state == GPIO.IOPinStateElement_High \
-                else GPIO.PinState.Low
+            GPIO.ensure_pin_exists(pin)
+            GPIO.PinBank.write(pin, pin_state == GPIO.IOPinStateElement_High)
 
-        GPIO.CurrentPinOutStates = new_pinout_states
         GPIO.logger.Log(LogType.Debug,
-                        f'Emulated Pin states : {GPIO.CurrentPinOutStates}')
+                        f'Emulated Pin states : {pinouts}')
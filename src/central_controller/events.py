@@ -15,6 +15,7 @@ limitations under the License.
 '''
 # pylint: disable=too-few-public-methods
 import enum
+from common.EventManager import EventCoalescingPolicy, EventPriority
 
 
 class EvtType(enum.Enum):
@@ -25,6 +26,8 @@ class EvtType(enum.Enum):
     #------------------------
     #- Device state change events
     SensorDeviceStateChange = 2001
+    SensorGracePeriodExpired = 2002
+    DevicePinEdge = 2003
 
     #------------------------
     #- Siren related events
@@ -41,8 +44,63 @@ class EvtType(enum.Enum):
     KeypadApiSendAlivePing = 5001
     KeypadApiSendKeypadLock = 5002
 
+    #------------------------
+    #- Configuration events
+    DevicesConfigCheck = 6001
+    DevicesConfigReload = 6002
+
+
+## Dispatch priority lanes for the central controller events.
+class EvtPriority:
+    ## Sirens, sensors and alarm state changes, never wait on other traffic.
+    SafetyCritical = EventPriority.High
+
+    ## Alarm state machine inputs, e.g. key codes entered on the keypad.
+    State = EventPriority.Normal
+
+    ## Communications with the keypad, these can block on network timeouts.
+    Comms = EventPriority.Low
+
+
+## Priority lane that each event type is dispatched from.
+EVENT_PRIORITIES = {
+    EvtType.KeypadKeyCodeEntered: EvtPriority.State,
+    EvtType.SensorDeviceStateChange: EvtPriority.SafetyCritical,
+    EvtType.SensorGracePeriodExpired: EvtPriority.SafetyCritical,
+    EvtType.DevicePinEdge: EvtPriority.SafetyCritical,
+    EvtType.ActivateSiren: EvtPriority.SafetyCritical,
+    EvtType.DeactivateSiren: EvtPriority.SafetyCritical,
+    EvtType.AlarmActivated: EvtPriority.SafetyCritical,
+    EvtType.AlarmDeactivated: EvtPriority.SafetyCritical,
+    EvtType.KeypadApiSendAlivePing: EvtPriority.Comms,
+    EvtType.KeypadApiSendKeypadLock: EvtPriority.Comms,
+    EvtType.DevicesConfigCheck: EvtPriority.State,
+    EvtType.DevicesConfigReload: EvtPriority.State
+}
+
+
+## Events that are idempotent, so pending duplicates are collapsed rather than
+## multiplying whilst the keypad is unreachable.
+EVENT_COALESCING_POLICIES = {
+    EvtType.KeypadApiSendAlivePing: EventCoalescingPolicy.AtMostOnePending,
+    EvtType.KeypadApiSendKeypadLock: EventCoalescingPolicy.ReplacePending,
+    EvtType.DevicesConfigCheck: EventCoalescingPolicy.AtMostOnePending,
+    EvtType.DevicesConfigReload: EventCoalescingPolicy.AtMostOnePending
+}
+
 
 class SensorDeviceBodyItem:
     DeviceType = 'deviceType'
     DeviceName = 'deviceName'
     State = 'state'
+    GracePeriodId = 'gracePeriodId'
+
+
+class DevicePinEdgeBodyItem:
+    Pin = 'pin'
+
+
+## Body item of the alarm and siren events giving the zone that they are for,
+## if it is missing then the event is for every zone.
+class AlarmZoneBodyItem:
+    Zone = 'zone'
@@ -0,0 +1,121 @@
+'''
+Copyright 2019 Secure Shed Project Dev Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+import hashlib
+import os
+
+try:
+    import inotify_simple
+    INOTIFY_AVAILABLE = True
+except ImportError:
+    INOTIFY_AVAILABLE = False
+
+
+## Cheap detection of changes to a file.  If inotify is available (Linux with
+#  the inotify_simple package) then the file is only looked at when the kernel
+#  reports activity on it.  Otherwise the file's mtime, size and inode are
+#  compared first, with the contents only hashed if those have changed, so an
+#  unchanged file costs a single stat() call.
+class FileChangeDetector:
+    __slots__ = ['_filename', '_hash', '_inotify', '_signature']
+
+    ## FileChangeDetector class constructor.
+    #  @param self The object pointer.
+    #  @param filename File to detect changes to.
+    #  @param use_inotify Use inotify if it is available.
+    def __init__(self, filename, use_inotify=True):
+        self._filename = filename
+        self._hash = None
+        self._inotify = None
+        self._signature = None
+
+        if use_inotify and INOTIFY_AVAILABLE:
+            self._inotify = self._create_inotify_watch(filename)
+
+
+    ## Check if the file has changed since the last call, the first call will
+    #  always report a change if the file exists.
+    #  @param self The object pointer.
+    #  @returns True if the contents of the file have changed.
+    def has_changed(self):
+        # If the kernel hasn't reported any activity on the directory then the
+        # file cannot have changed.
+        if self._inotify is not None and self._signature is not None:
+            if not self._inotify.read(timeout=0):
+                return False
+
+        try:
+            stat_info = os.stat(self._filename)
+
+        except OSError:
+            return False
+
+        signature = (stat_info.st_mtime_ns, stat_info.st_size,
+                     stat_info.st_ino)
+
+        if signature == self._signature:
+            return False
+
+        self._signature = signature
+
+        # The metadata has changed, only report a change if the contents have
+        # too (e.g. the file was touched or rewritten with the same contents).
+        new_hash = self._hash_file()
+        if new_hash is None or new_hash == self._hash:
+            return False
+
+        self._hash = new_hash
+        return True
+
+
+    ## Forget the last seen state of the file, the next call to has_changed()
+    #  will report a change.
+    #  @param self The object pointer.
+    def reset(self):
+        self._hash = None
+        self._signature = None
+
+
+    ## Generate a MD5 hash of the file.
+    #  @param self The object pointer.
+    #  @returns MD5 hash if the file was hashed correctly, otherwise None.
+    def _hash_file(self):
+        try:
+            with open(self._filename, 'rb') as file_handle:
+                return hashlib.md5(file_handle.read()).hexdigest()
+
+        except IOError:
+            return None
+
+
+    ## Create an inotify watch on the directory of the file, the directory is
+    #  watched so that files that are replaced (e.g. by an editor) are seen.
+    #  @param self The object pointer.
+    #  @param filename File to watch.
+    #  @returns INotify instance or None if the watch could not be added.
+    @staticmethod
+    def _create_inotify_watch(filename):
+        flags = inotify_simple.flags
+        watch_flags = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | \
+            flags.DELETE | flags.ATTRIB
+
+        try:
+            inotify = inotify_simple.INotify()
+            inotify.add_watch(os.path.dirname(os.path.abspath(filename)),
+                              watch_flags)
+            return inotify
+
+        except OSError:
+            return None
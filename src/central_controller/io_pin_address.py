@@ -0,0 +1,86 @@
+'''
+Copyright 2019 Secure Shed Project Dev Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+import re
+
+
+## Addressing of IO pins.  Pins are organised into banks of a fixed size,
+#  bank 0 is the Raspberry Pi's own GPIO header (e.g. 'GPIO05') and banks 1
+#  onwards are I2C/SPI GPIO expander boards (e.g. 'EXP1_07' is pin 7 of the
+#  first expander).  Every pin maps to a single flat pin number, which is what
+#  the GPIO interface and device plug-ins use.
+class IoPinAddress:
+
+    ## Number of pins in each bank.
+    PinsPerBank = 32
+
+    ## Pin id prefix : Raspberry Pi GPIO header.
+    GPIOPrefix = 'GPIO'
+
+    ## Pin id prefix : GPIO expander board.
+    ExpanderPrefix = 'EXP'
+
+    ## Regular expression that a pin id must match, this is also used by the
+    #  json schemas.
+    PinIdPattern = r'^(GPIO[0-9]{2}|EXP[1-9][0-9]*_[0-9]{2})$'
+
+    _pin_id_regex = re.compile(
+        r"^(?:GPIO([0-9]{2})|EXP([1-9][0-9]*)_([0-9]{2}))$")
+
+
+    ## Convert a pin id to its flat pin number.
+    #  @param pin_id Pin id, e.g. 'GPIO05' or 'EXP1_07'.
+    #  @returns Pin number.
+    #  @throws ValueError if the pin id is not valid.
+    @staticmethod
+    def to_pin_number(pin_id):
+        match = IoPinAddress._pin_id_regex.fullmatch(pin_id)
+        if not match:
+            raise ValueError(f"Invalid IO pin id '{pin_id}'")
+
+        gpio_pin, expander, expander_pin = match.groups()
+
+        if gpio_pin is not None:
+            bank, pin = 0, int(gpio_pin)
+
+        else:
+            bank, pin = int(expander), int(expander_pin)
+
+        if pin >= IoPinAddress.PinsPerBank:
+            raise ValueError(f"Invalid IO pin id '{pin_id}', pin is out " +
+                             "of range for the bank")
+
+        return (bank * IoPinAddress.PinsPerBank) + pin
+
+
+    ## Convert a flat pin number to its pin id.
+    #  @param pin_number Pin number.
+    #  @returns Pin id, e.g. 'GPIO05' or 'EXP1_07'.
+    @staticmethod
+    def to_pin_id(pin_number):
+        bank, pin = divmod(pin_number, IoPinAddress.PinsPerBank)
+
+        if bank == 0:
+            return f'{IoPinAddress.GPIOPrefix}{pin:02}'
+
+        return f'{IoPinAddress.ExpanderPrefix}{bank}_{pin:02}'
+
+
+    ## Check if a pin number is on a GPIO expander board.
+    #  @param pin_number Pin number.
+    #  @returns True if the pin is on an expander, False if on the Pi itself.
+    @staticmethod
+    def is_expander_pin(pin_number):
+        return pin_number >= IoPinAddress.PinsPerBank
@@ -0,0 +1,592 @@
+'''
+Copyright 2019 Secure Shed Project Dev Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+import collections
+import concurrent.futures
+import importlib
+import itertools
+import multiprocessing
+import time
+from central_controller.DeviceTypes.base_device_type import BaseDeviceType
+import central_controller.events as Evts
+from common.Logger import LogType
+
+
+## Messages passed between the controller and a plug-in's process.
+class IsolatedMsg:
+    # pylint: disable=too-few-public-methods
+
+    ## Controller => plug-in : call a plug-in method.
+    Call = 'call'
+
+    ## Plug-in => controller : return value of a call.
+    Result = 'result'
+
+    ## Plug-in => controller : a call raised an exception.
+    Error = 'error'
+
+    ## Plug-in => controller : hardware IO function call (e.g. output).
+    HardwareIO = 'io'
+
+    ## Plug-in => controller : queue an event.
+    QueueEvent = 'queueEvent'
+
+    ## Plug-in => controller : schedule an event.
+    ScheduleEvent = 'scheduleEvent'
+
+    ## Plug-in => controller : cancel a scheduled event.
+    CancelScheduledEvent = 'cancelScheduledEvent'
+
+    ## Plug-in => controller : log a message.
+    Log = 'log'
+
+
+## Hardware IO constants that are copied into a plug-in's process.
+HARDWARE_IO_CONSTANTS = ('BCM', 'BOARD', 'IN', 'OUT', 'LOW', 'HIGH', 'PUD_UP',
+                         'PUD_DOWN', 'RISING', 'FALLING', 'BOTH')
+
+## Hardware IO functions that a plug-in's process may call.
+HARDWARE_IO_FUNCTIONS = ('setup', 'output')
+
+
+## Device plug-in hosted in its own process, so a slow, wedged or crashing
+#  plug-in cannot hold up the scan loop or event dispatch.  This is a proxy
+#  with the same interface as the plug-in, calls are passed to the plug-in's
+#  process over a pipe.  The controller keeps ownership of the hardware IO,
+#  so the plug-in is sent the state of its pins with each call and its
+#  setup() and output() calls are carried out by the controller.
+#
+#  Only initialise() waits for the plug-in, every other call is passed on
+#  without waiting and the replies are collected by service(), which must be
+#  called on each scan.  A watchdog restarts the plug-in's process (and
+#  re-initialises the plug-in) if a call isn't answered in time.  The restart
+#  is done on a thread pool so the scan loop isn't held up, the device can't
+#  be used until it has completed.
+class IsolatedDevice(BaseDeviceType):
+    # pylint: disable=too-many-instance-attributes
+
+    ## Time (in seconds) the plug-in has to start and initialise.
+    InitialiseTimeoutSecs = 10.0
+
+    ## Time (in seconds) the plug-in has to answer a call before its process
+    #  is restarted.
+    WatchdogSecs = 5.0
+
+    ## Number of unanswered calls after which the plug-in is considered hung,
+    #  this also stops the pipe to a hung plug-in filling up.
+    MaxPendingCalls = 32
+
+    ## Number of plug-in processes that can be restarting at once.
+    RestartWorkers = 2
+
+    ## Events that set the alarm state of a plug-in, event ID => group.  The
+    #  last event received of each group is passed to a restarted plug-in so
+    #  that it is put back into the same state.
+    ReplayedEvents = {
+        Evts.EvtType.AlarmActivated: 'alarm',
+        Evts.EvtType.AlarmDeactivated: 'alarm',
+        Evts.EvtType.ActivateSiren: 'siren',
+        Evts.EvtType.DeactivateSiren: 'siren'
+    }
+
+    ## Thread pool the plug-in processes are restarted on, shared by all of
+    #  the isolated devices and created when it is first needed.
+    _restart_pool = None
+
+    ## Property getter : Class of the plug-in that is being hosted.
+    @property
+    def plugin_class(self):
+        return self._plugin_class
+
+
+    ## IsolatedDevice class constructor.
+    #  @param self The object pointer.
+    #  @param pluginClass Device plug-in class (derived from BaseDeviceType).
+    #  @param hardwareIO Hardware IO (e.g. RPi.GPIO) instance.
+    #  @param eventMgr Event manager instance.
+    #  @param logger Logger instance.
+    def __init__(self, pluginClass, hardwareIO, eventMgr, logger):
+        self._conn = None
+        self._edge_pins = []
+        self._event_mgr = eventMgr
+        self._hardware_io = hardwareIO
+        self._init_args = None
+        self._logger = logger
+        self._pending_calls = collections.deque()
+        self._pins = set()
+        self._plugin_class = pluginClass
+        self._process = None
+        self._replay_events = {}
+        self._restart = None
+        self._timers = {}
+
+
+    ## Start the plug-in's process and initialise the plug-in.
+    #  @param self The object pointer.
+    #  @param device_name Name of device instance.
+    #  @param pins Pin(s) layout.
+    #  @param additional_params Additional optional parameters for the device.
+    #  @returns True if the plug-in initialised.
+    def initialise(self, device_name, pins, additional_params):
+        self._init_args = (device_name, pins, additional_params)
+        return self._start_plugin()
+
+
+    ## Ask the plug-in to check its device, a check isn't requested whilst the
+    #  plug-in is still busy with a previous call.
+    #  @param self The object pointer.
+    def check_device(self):
+        if not self._pending_calls:
+            self._call_async('check_device')
+
+
+    #  @param self The object pointer.
+    #  @param event Event instance.
+    def receive_event(self, event):
+        group = self.ReplayedEvents.get(event.id)
+        if group is not None:
+            self._replay_events[group] = event
+
+        self._call_async('receive_event', event)
+
+
+    ## Pins the plug-in wants edge detection on, as reported when it was
+    #  initialised.
+    #  @param self The object pointer.
+    def edge_detect_pins(self):
+        return list(self._edge_pins)
+
+
+    #  @param self The object pointer.
+    #  @param pin Pin number that has changed.
+    #  @param state New state of the pin.
+    def pin_state_changed(self, pin, state):
+        self._call_async('pin_state_changed', pin, state)
+
+
+    ## Stop the plug-in's process, the plug-in's own shutdown() is called
+    #  first if it is responding.
+    #  @param self The object pointer.
+    def shutdown(self):
+        if self._restart is not None:
+            concurrent.futures.wait([self._restart])
+            self._restart = None
+
+        if self._conn is not None and not self._pending_calls:
+            self._call_async('shutdown')
+
+            if self._process is not None:
+                self._process.join(1.0)
+
+        self._stop_plugin()
+
+
+    ## Collect the replies and requests from the plug-in's process and restart
+    #  the process if the plug-in has stopped responding.
+    #  @param self The object pointer.
+    #  @returns True if the plug-in has finished restarting, the pins it wants
+    #           edge detection on may have changed.
+    def service(self):
+        if self._restart is not None:
+            if not self._restart.done():
+                return False
+
+            self._complete_restart()
+            return True
+
+        if self._conn is None:
+            return False
+
+        try:
+            while self._conn.poll(0):
+                self._handle_message(self._conn.recv())
+
+        except (EOFError, OSError):
+            self._restart_plugin('its process has exited')
+            return False
+
+        if self._pending_calls and \
+           time.monotonic() - self._pending_calls[0] > self.WatchdogSecs:
+            self._restart_plugin('it has stopped responding')
+            return False
+
+        # Forget the plug-in's timers that have fired, they can no longer be
+        # cancelled.
+        if self._timers:
+            now = self._event_mgr.Clock.Monotonic()
+            self._timers = {plugin_timer_id: timer
+                            for plugin_timer_id, timer in self._timers.items()
+                            if timer[1] > now}
+
+        return False
+
+
+    ## Start the plug-in's process and initialise the plug-in, waiting for it
+    #  to reply.
+    #  @param self The object pointer.
+    #  @returns True if the plug-in initialised.
+    def _start_plugin(self):
+        context = multiprocessing.get_context('spawn')
+        parent_conn, child_conn = context.Pipe()
+        constants = {name: getattr(self._hardware_io, name)
+                     for name in HARDWARE_IO_CONSTANTS
+                     if hasattr(self._hardware_io, name)}
+
+        self._process = context.Process(
+            target=_plugin_process_main, daemon=True,
+            name=f'Plugin-{self._init_args[0]}',
+            args=(child_conn, self._plugin_class.__module__,
+                  self._plugin_class.__name__, constants))
+        self._process.start()
+        child_conn.close()
+
+        self._conn = parent_conn
+        self._pending_calls.clear()
+
+        try:
+            if not self._call_sync('initialise', *self._init_args):
+                self._stop_plugin()
+                return False
+
+            self._edge_pins = self._call_sync('edge_detect_pins') or []
+
+        except TimeoutError:
+            self._logger.Log(LogType.Error,
+                             "Device '%s' plug-in process didn't initialise " +\
+                             "within %s seconds", self._init_args[0],
+                             self.InitialiseTimeoutSecs)
+            self._stop_plugin()
+            return False
+
+        # Any other failure (e.g. the plug-in raising or the process dying)
+        # is left to the caller, but the process mustn't be leaked.
+        except Exception:
+            self._stop_plugin()
+            raise
+
+        return True
+
+
+    ## Stop the plug-in's process and cancel any events it has scheduled.
+    #  @param self The object pointer.
+    def _stop_plugin(self):
+        for timer_id, _ in self._timers.values():
+            self._event_mgr.CancelScheduledEvent(timer_id)
+        self._timers = {}
+
+        if self._process is not None and self._process.is_alive():
+            self._process.kill()
+            self._process.join(1.0)
+
+        if self._conn is not None:
+            self._conn.close()
+
+        self._conn = None
+        self._edge_pins = []
+        self._pending_calls.clear()
+        self._process = None
+
+
+    ## Restart the plug-in's process on the restart thread pool, any calls
+    #  that were pending are lost.  Until the restart has completed (see
+    #  service()) calls to the plug-in are dropped.
+    #  @param self The object pointer.
+    #  @param reason Reason for the restart, for logging.
+    def _restart_plugin(self, reason):
+        self._logger.Log(LogType.Error,
+                         "Restarting device '%s' plug-in process as %s",
+                         self._init_args[0], reason)
+        self._stop_plugin()
+
+        if IsolatedDevice._restart_pool is None:
+            IsolatedDevice._restart_pool = \
+                concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.RestartWorkers,
+                    thread_name_prefix='PluginRestart')
+
+        self._restart = IsolatedDevice._restart_pool.submit(self._start_plugin)
+
+
+    ## Complete a restart of the plug-in's process, if it restarted then the
+    #  last alarm state events are passed to it again.
+    #  @param self The object pointer.
+    def _complete_restart(self):
+        try:
+            restarted = self._restart.result()
+
+        except Exception as excpt:  # pylint: disable=broad-except
+            self._logger.Log(LogType.Error,
+                             "Device '%s' plug-in restart raised '%s'",
+                             self._init_args[0], excpt)
+            self._stop_plugin()
+            restarted = False
+
+        self._restart = None
+
+        if not restarted:
+            self._logger.Log(LogType.Error,
+                             "Device '%s' plug-in failed to restart so it " +\
+                             "cannot be used.", self._init_args[0])
+            return
+
+        self._logger.Log(LogType.Info,
+                         "Device '%s' plug-in process has restarted",
+                         self._init_args[0])
+
+        for event in self._replay_events.values():
+            self._call_async('receive_event', event)
+
+
+    ## Call a plug-in method and wait for its return value.
+    #  @param self The object pointer.
+    #  @param method Name of the method.
+    #  @param args Arguments of the method.
+    #  @returns The method's return value.
+    #  @throws TimeoutError if the plug-in doesn't reply in time.
+    #  @throws NotImplementedError if the plug-in doesn't implement the method.
+    def _call_sync(self, method, *args):
+        self._send_call(method, args)
+        deadline = time.monotonic() + self.InitialiseTimeoutSecs
+
+        try:
+            while True:
+                if not self._conn.poll(max(0.0, deadline - time.monotonic())):
+                    raise TimeoutError(method)
+
+                msg = self._conn.recv()
+                if msg[0] in (IsolatedMsg.Result, IsolatedMsg.Error):
+                    self._pending_calls.popleft()
+
+                    if msg[0] == IsolatedMsg.Error:
+                        return self._plugin_error(msg[1], msg[2])
+
+                    return msg[1]
+
+                self._handle_message(msg)
+
+        except (EOFError, OSError) as err:
+            raise TimeoutError(method) from err
+
+
+    ## Call a plug-in method without waiting for it to complete.
+    #  @param self The object pointer.
+    #  @param method Name of the method.
+    #  @param args Arguments of the method.
+    def _call_async(self, method, *args):
+        if self._conn is None or self._restart is not None:
+            return
+
+        if len(self._pending_calls) >= self.MaxPendingCalls:
+            self._restart_plugin('it has too many unanswered calls')
+            return
+
+        try:
+            self._send_call(method, args)
+
+        except (EOFError, OSError):
+            self._restart_plugin('its process has exited')
+
+
+    ## Send a call to the plug-in along with the state of its pins and the
+    #  current clock time.
+    #  @param self The object pointer.
+    #  @param method Name of the method.
+    #  @param args Arguments of the method.
+    def _send_call(self, method, args):
+        pin_states = {pin: self._hardware_io.input(pin) for pin in self._pins}
+        clock = self._event_mgr.Clock
+        self._conn.send((IsolatedMsg.Call, method, args, pin_states,
+                         (clock.Time(), clock.Monotonic())))
+        self._pending_calls.append(time.monotonic())
+
+
+    ## Handle a message from the plug-in's process.
+    #  @param self The object pointer.
+    #  @param msg Message tuple, the first item is the IsolatedMsg type.
+    def _handle_message(self, msg):
+        msg_type = msg[0]
+
+        if msg_type == IsolatedMsg.Result:
+            self._pending_calls.popleft()
+
+        elif msg_type == IsolatedMsg.Error:
+            self._pending_calls.popleft()
+            self._logger.Log(LogType.Error,
+                             "Device '%s' plug-in raised %s: %s",
+                             self._init_args[0], msg[1], msg[2])
+
+        elif msg_type == IsolatedMsg.HardwareIO:
+            _, function, args, kwargs = msg
+            if function in HARDWARE_IO_FUNCTIONS:
+                self._pins.add(args[0])
+                getattr(self._hardware_io, function)(*args, **kwargs)
+
+        elif msg_type == IsolatedMsg.QueueEvent:
+            self._event_mgr.QueueEvent(msg[1])
+
+        elif msg_type == IsolatedMsg.ScheduleEvent:
+            _, plugin_timer_id, delay, event = msg
+            deadline = self._event_mgr.Clock.Monotonic() + max(0.0, delay)
+            self._timers[plugin_timer_id] = \
+                (self._event_mgr.ScheduleEvent(delay, event), deadline)
+
+        elif msg_type == IsolatedMsg.CancelScheduledEvent:
+            timer = self._timers.pop(msg[1], None)
+            if timer is not None:
+                self._event_mgr.CancelScheduledEvent(timer[0])
+
+        elif msg_type == IsolatedMsg.Log:
+            self._logger.Log(LogType(msg[1]), msg[2])
+
+
+    ## Handle an exception raised by a plug-in method that was waited for,
+    #  NotImplementedError is raised again as that is handled by the callers.
+    #  @param self The object pointer.
+    #  @param exception_name Name of the exception type.
+    #  @param message Exception message.
+    #  @returns None, as the method's return value.
+    def _plugin_error(self, exception_name, message):
+        if exception_name == NotImplementedError.__name__:
+            raise NotImplementedError(message)
+
+        self._logger.Log(LogType.Error, "Device '%s' plug-in raised %s: %s",
+                         self._init_args[0], exception_name, message)
+
+
+## Hardware IO given to a plug-in in its own process.  Pin states are those
+#  sent with the latest call, setup() and output() are passed back to the
+#  controller.
+class _PipeHardwareIO:
+
+    #  @param self The object pointer.
+    #  @param conn Pipe connection to the controller.
+    #  @param constants Hardware IO constants, name => value.
+    def __init__(self, conn, constants):
+        self.__dict__.update(constants)
+        self.pin_states = {}
+        self._conn = conn
+
+
+    #  @param self The object pointer.
+    def setup(self, pin, mode, **kwargs):
+        self._conn.send((IsolatedMsg.HardwareIO, 'setup', (pin, mode), kwargs))
+
+
+    #  @param self The object pointer.
+    def output(self, pin, state):
+        self.pin_states[pin] = state
+        self._conn.send((IsolatedMsg.HardwareIO, 'output', (pin, state), {}))
+
+
+    #  @param self The object pointer.
+    def input(self, pin):
+        return self.pin_states.get(pin, getattr(self, 'HIGH', 1))
+
+
+## Clock given to a plug-in in its own process, it reads the controller's
+#  clock time as sent with the latest call.
+class _PipeClock:
+
+    #  @param self The object pointer.
+    def __init__(self):
+        self.now = (time.time(), time.monotonic())
+
+
+    #  @param self The object pointer.
+    def Time(self):
+        return self.now[0]
+
+
+    #  @param self The object pointer.
+    def Monotonic(self):
+        return self.now[1]
+
+
+## Event manager given to a plug-in in its own process, events are passed
+#  back to the controller's event manager.
+class _PipeEventManager:
+
+    #  @param self The object pointer.
+    #  @param conn Pipe connection to the controller.
+    def __init__(self, conn):
+        self.Clock = _PipeClock()
+        self._conn = conn
+        self._timer_ids = itertools.count(1)
+
+
+    #  @param self The object pointer.
+    def QueueEvent(self, event):
+        self._conn.send((IsolatedMsg.QueueEvent, event))
+
+
+    #  @param self The object pointer.
+    def ScheduleEvent(self, delay, event):
+        timer_id = next(self._timer_ids)
+        self._conn.send((IsolatedMsg.ScheduleEvent, timer_id, delay, event))
+        return timer_id
+
+
+    #  @param self The object pointer.
+    def CancelScheduledEvent(self, timerId):
+        self._conn.send((IsolatedMsg.CancelScheduledEvent, timerId))
+        return True
+
+
+## Logger given to a plug-in in its own process.
+class _PipeLogger:
+    # pylint: disable=too-few-public-methods
+
+    #  @param self The object pointer.
+    #  @param conn Pipe connection to the controller.
+    def __init__(self, conn):
+        self._conn = conn
+
+
+    #  @param self The object pointer.
+    def Log(self, logType, msg, *args):
+        self._conn.send((IsolatedMsg.Log, logType.value,
+                         msg % args if args else msg))
+
+
+## Entry point of a plug-in's process, calls from the controller are carried
+#  out until the controller closes the pipe or the plug-in is shut down.
+#  @param conn Pipe connection to the controller.
+#  @param module_name Module containing the plug-in class.
+#  @param class_name Name of the plug-in class.
+#  @param constants Hardware IO constants, name => value.
+def _plugin_process_main(conn, module_name, class_name, constants):
+    hardware_io = _PipeHardwareIO(conn, constants)
+    event_mgr = _PipeEventManager(conn)
+    plugin_class = getattr(importlib.import_module(module_name), class_name)
+    plugin = plugin_class(hardware_io, event_mgr, _PipeLogger(conn))
+
+    while True:
+        try:
+            _, method, args, pin_states, now = conn.recv()
+
+        except (EOFError, OSError):
+            return
+
+        hardware_io.pin_states.update(pin_states)
+        event_mgr.Clock.now = now
+
+        try:
+            conn.send((IsolatedMsg.Result, getattr(plugin, method)(*args)))
+
+        except Exception as excpt:  # pylint: disable=broad-except
+            conn.send((IsolatedMsg.Error, type(excpt).__name__, str(excpt)))
+
+        if method == 'shutdown':
+            return
@@ -0,0 +1,143 @@
+'''
+Copyright 2019 Secure Shed Project Dev Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+import collections
+from central_controller.devices_config_loader import DevicesConfigLoader
+
+
+## Debounce filter that only accepts a new pin state once the pin has stayed
+#  in that state for a minimum time, any bounce back restarts the timer.
+class StableTimeFilter:
+    __slots__ = ['_candidate', '_candidate_since', '_stable_secs', '_state']
+
+    ## Property getter : Settled state of the pin.
+    @property
+    def state(self):
+        return self._state
+
+
+    ## Property getter : True if the pin hasn't settled yet, so the filter
+    #  needs to keep being updated even when the pin doesn't change.
+    @property
+    def is_settling(self):
+        return self._candidate != self._state
+
+
+    ## StableTimeFilter class constructor.
+    #  @param self The object pointer.
+    #  @param stable_ms Time (in milliseconds) the pin must be stable for.
+    #  @param initial_state Settled state of the pin to start with.
+    def __init__(self, stable_ms, initial_state):
+        self._candidate = initial_state
+        self._candidate_since = None
+        self._stable_secs = stable_ms / 1000.0
+        self._state = initial_state
+
+
+    ## Add a sample of the pin state.
+    #  @param self The object pointer.
+    #  @param state Sampled state of the pin.
+    #  @param now Current (monotonic) time in seconds.
+    #  @returns The new settled state if the pin has settled into a different
+    #           state, otherwise None.
+    def update(self, state, now):
+        if state != self._candidate:
+            self._candidate = state
+            self._candidate_since = now
+
+        if self._candidate == self._state:
+            return None
+
+        if now - self._candidate_since < self._stable_secs:
+            return None
+
+        self._state = self._candidate
+        return self._state
+
+
+## Debounce filter that takes the majority state of the last K samples, a tie
+#  keeps the current settled state.
+class MajorityFilter:
+    __slots__ = ['_samples', '_state']
+
+    ## Property getter : Settled state of the pin.
+    @property
+    def state(self):
+        return self._state
+
+
+    ## Property getter : True if the samples don't all agree yet, so the filter
+    #  needs to keep being updated even when the pin doesn't change.
+    @property
+    def is_settling(self):
+        high_samples = sum(self._samples)
+        return 0 < high_samples < len(self._samples)
+
+
+    ## MajorityFilter class constructor.
+    #  @param self The object pointer.
+    #  @param sample_count Number of samples the majority is taken from.
+    #  @param initial_state Settled state of the pin to start with.
+    def __init__(self, sample_count, initial_state):
+        self._samples = collections.deque([initial_state] * sample_count,
+                                          maxlen=sample_count)
+        self._state = initial_state
+
+
+    ## Add a sample of the pin state.
+    #  @param self The object pointer.
+    #  @param state Sampled state of the pin.
+    #  @param now Current (monotonic) time in seconds, unused.
+    #  @returns The new settled state if the majority has changed, otherwise
+    #           None.
+    def update(self, state, now):
+        # pylint: disable=unused-argument
+        self._samples.append(1 if state else 0)
+
+        high_votes = sum(self._samples) * 2
+        if high_votes > len(self._samples):
+            majority = 1
+
+        elif high_votes < len(self._samples):
+            majority = 0
+
+        else:
+            return None
+
+        if majority == self._state:
+            return None
+
+        self._state = majority
+        return majority
+
+
+## Create the debounce filter described by a device's debounce settings.
+#  @param settings Debounce settings from devices.json, None = no filter.
+#  @param initial_state Current state of the pin.
+#  @returns Filter instance or None if the device isn't debounced.
+def create_debounce_filter(settings, initial_state):
+    if not settings:
+        return None
+
+    stable_ms = settings.get(DevicesConfigLoader.DebounceElement.StableMs)
+    if stable_ms:
+        return StableTimeFilter(stable_ms, initial_state)
+
+    sample_count = settings.get(
+        DevicesConfigLoader.DebounceElement.MajoritySamples)
+    if sample_count:
+        return MajorityFilter(sample_count, initial_state)
+
+    return None
@@ -0,0 +1,316 @@
+'''
+Copyright 2019 Secure Shed Project Dev Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+import collections
+import json
+import time
+from central_controller.emulated_raspberry_pi_io import GPIO
+import central_controller.events as Evts
+from central_controller.io_pin_address import IoPinAddress
+from common.json_enabled_class import JsonLoadingClass
+from common.Logger import LogType
+
+
+## Playback of a scripted timeline of pin transitions into the GPIO emulator.
+#  Steps are timestamped in scenario seconds and replayed at a configurable
+#  speed (e.g. 10.0 is ten times faster than real time).  The events that the
+#  controller raises in response are recorded along with their latency from
+#  the most recent pin transition, giving a repeatable end-to-end workload.
+#
+#  Playback is driven by the worker thread calling play_due_steps(), so the
+#  pins are changed on the same thread that scans them.  Step times follow the
+#  event manager's clock, whereas latencies are always measured in real time.
+class ScenarioPlayer(JsonLoadingClass):
+    # pylint: disable=too-many-instance-attributes
+
+    __slots__ = ['_event_mgr', '_last_error_msg', '_last_step_time',
+                 '_logger', '_pin_sampler', '_recorded', '_results_file',
+                 '_settle_secs', '_speed', '_start_time', '_steps',
+                 '_steps_played']
+
+    class JsonTopElement:
+        # pylint: disable=too-few-public-methods
+        Speed = 'speed'
+        SettleSecs = 'settleSecs'
+        Steps = 'steps'
+
+    class StepElement:
+        # pylint: disable=too-few-public-methods
+        Time = 'time'
+        Pin = 'pin'
+        State = 'state'
+
+    class PinState:
+        # pylint: disable=too-few-public-methods
+        High = 'high'
+        Low = 'low'
+
+    ## Scenario step, time is in scenario seconds from the start of playback.
+    Step = collections.namedtuple('Step', 'time pin state')
+
+    ## Default time (in scenario seconds) to keep recording after the last
+    #  step, so the events it causes are captured.
+    DefaultSettleSecs = 1.0
+
+    ## Events that are recorded as the outcome of a scenario.
+    RecordedEvents = (
+        Evts.EvtType.SensorDeviceStateChange,
+        Evts.EvtType.AlarmActivated,
+        Evts.EvtType.AlarmDeactivated,
+        Evts.EvtType.ActivateSiren,
+        Evts.EvtType.DeactivateSiren
+    )
+
+    ## Scenario file's Json schema.
+    JsonSchema = \
+    {
+        "$schema": "http://json-schema.org/draft-07/schema#",
+
+        "definitions":
+        {
+            "step":
+            {
+                "type" : "object",
+                "properties":
+                {
+                    StepElement.Time:
+                    {
+                        "type": "number",
+                        "minimum": 0
+                    },
+                    StepElement.Pin:
+                    {
+                        "type": "string",
+                        "pattern": IoPinAddress.PinIdPattern
+                    },
+                    StepElement.State:
+                    {
+                        "type": "string",
+                        "enum": [PinState.High, PinState.Low]
+                    }
+                },
+                "additionalProperties": False,
+                "required":
+                [
+                    StepElement.Time,
+                    StepElement.Pin,
+                    StepElement.State
+                ]
+            }
+        },
+        "type" : "object",
+        "properties":
+        {
+            JsonTopElement.Speed:
+            {
+                "type": "number",
+                "exclusiveMinimum": 0
+            },
+            JsonTopElement.SettleSecs:
+            {
+                "type": "number",
+                "minimum": 0
+            },
+            JsonTopElement.Steps:
+            {
+                "type": "array",
+                "items": {"$ref": "#/definitions/step"}
+            }
+        },
+        "required" : [JsonTopElement.Steps],
+        "additionalProperties" : False
+    }
+
+    ## Property getter : Last error message
+    @property
+    def last_error_msg(self):
+        return self._last_error_msg
+
+
+    ## Property getter : Clock time (monotonic) that the next step is due,
+    #  None if playback hasn't started or has finished.
+    @property
+    def next_step_time(self):
+        if self._start_time is None:
+            return None
+
+        if self._steps_played < len(self._steps):
+            step_time = self._steps[self._steps_played].time
+
+        else:
+            step_time = self._steps[-1].time + self._settle_secs \
+                if self._steps else self._settle_secs
+
+        return self._start_time + (step_time / self._speed)
+
+
+    ## ScenarioPlayer class constructor.
+    #  @param self The object pointer.
+    #  @param eventMgr Event manager instance.
+    #  @param logger Logger instance.
+    #  @param speed Playback speed, overrides the scenario file if set.
+    #  @param resultsFile Optional file to write the recorded outcome to.
+    #  @param pinSampler Optional function called after each step to sample
+    #         the pins (e.g. DeviceManager.sample_pins).
+    def __init__(self, eventMgr, logger, speed=None, resultsFile=None,
+                 pinSampler=None):
+        # pylint: disable=too-many-arguments
+        self._event_mgr = eventMgr
+        self._last_error_msg = ''
+        self._last_step_time = None
+        self._logger = logger
+        self._pin_sampler = pinSampler
+        self._recorded = []
+        self._results_file = resultsFile
+        self._settle_secs = self.DefaultSettleSecs
+        self._speed = speed
+        self._start_time = None
+        self._steps = []
+        self._steps_played = 0
+
+
+    ## Load a scenario file.
+    #  @param self The object pointer.
+    #  @param filename Scenario file.
+    #  @returns True if the scenario was loaded, else False and last_error_msg
+    #  is set.
+    def load(self, filename):
+        self._last_error_msg = ''
+
+        data, err_msg = self.read_json_file(filename, self.JsonSchema, True)
+        if not data:
+            self._last_error_msg = err_msg
+            return False
+
+        if self._speed is None:
+            self._speed = data.get(self.JsonTopElement.Speed, 1.0)
+
+        self._settle_secs = data.get(self.JsonTopElement.SettleSecs,
+                                     self.DefaultSettleSecs)
+
+        steps = []
+        for step in data[self.JsonTopElement.Steps]:
+            pin = IoPinAddress.to_pin_number(step[self.StepElement.Pin])
+            state = step[self.StepElement.State] == self.PinState.High
+            steps.append(self.Step(time=step[self.StepElement.Time],
+                                   pin=pin, state=state))
+
+        # Steps are replayed in time order, steps with the same time keep the
+        # order they are in the file.
+        self._steps = sorted(steps, key=lambda step: step.time)
+        return True
+
+
+    ## Start playback, from now on the events raised by the controller are
+    #  recorded.
+    #  @param self The object pointer.
+    def start(self):
+        for event_id in self.RecordedEvents:
+            self._event_mgr.RegisterEvent(event_id, self._record_event)
+
+        for step in self._steps:
+            GPIO.ensure_pin_exists(step.pin)
+
+        self._logger.Log(LogType.Info,
+                         'Playing scenario of %s steps at %sx speed',
+                         len(self._steps), self._speed)
+        self._start_time = self._event_mgr.Clock.Monotonic()
+
+
+    ## Apply the steps that are due, each step has edge detection and pin
+    #  sampling run on its own so that quick transitions aren't merged
+    #  together.  Once the last
+    #  step has been played and the settle time has passed the results are
+    #  reported and playback stops.
+    #  @param self The object pointer.
+    def play_due_steps(self):
+        if self._start_time is None:
+            return
+
+        now = self._event_mgr.Clock.Monotonic()
+
+        while self._steps_played < len(self._steps):
+            step = self._steps[self._steps_played]
+            if self._start_time + (step.time / self._speed) > now:
+                return
+
+            GPIO.PinBank.write(step.pin, step.state)
+            self._last_step_time = time.monotonic()
+            GPIO.detect_edges()
+
+            if self._pin_sampler:
+                self._pin_sampler()
+
+            self._steps_played += 1
+
+        if now >= self.next_step_time:
+            self._finish()
+
+
+    ## Event handler for the recorded events.
+    #  @param self The object pointer.
+    #  @param event Event raised by the controller.
+    def _record_event(self, event):
+        elapsed = self._event_mgr.Clock.Monotonic() - self._start_time
+        latency = None
+
+        if self._last_step_time is not None:
+            latency = (time.monotonic() - self._last_step_time) * 1000.0
+
+        self._recorded.append({
+            'time': elapsed * self._speed,
+            'event': event.id.name,
+            'body': event.body,
+            'latencyMs': latency
+        })
+
+
+    ## Stop recording and report the outcome of the scenario.
+    #  @param self The object pointer.
+    def _finish(self):
+        for event_id in self.RecordedEvents:
+            self._event_mgr.UnregisterEvent(event_id, self._record_event)
+
+        self._start_time = None
+
+        latencies = [entry['latencyMs'] for entry in self._recorded
+                     if entry['latencyMs'] is not None]
+        self._logger.Log(LogType.Info,
+                         'Scenario finished: %s steps played, %s events recorded',
+                         self._steps_played, len(self._recorded))
+
+        if latencies:
+            self._logger.Log(LogType.Info,
+                             'Scenario latency: mean %.3f ms, max %.3f ms',
+                             sum(latencies) / len(latencies), max(latencies))
+
+        if not self._results_file:
+            return
+
+        results = {
+            'speed': self._speed,
+            'stepsPlayed': self._steps_played,
+            'events': self._recorded
+        }
+
+        try:
+            with open(self._results_file, 'w',
+                      encoding='utf-8') as file_handle:
+                json.dump(results, file_handle, indent=4, default=str)
+
+        except IOError as excpt:
+            self._logger.Log(LogType.Error,
+                             "Unable to write scenario results '%s', reason: %s",
+                             self._results_file, excpt.strerror)
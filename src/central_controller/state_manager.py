@@ -15,9 +15,10 @@ limitations under the License.
 '''
 import enum
 import json
-import time
+import threading
 import APIs.CentralController.JsonSchemas as schemas
 import APIs.Keypad.JsonSchemas as keypadApi
+from central_controller.devices_config_loader import DevicesConfigLoader
 import central_controller.events as Evts
 from common.APIClient.APIEndpointClient import APIEndpointClient
 from common.APIClient.HTTPStatusCode import HTTPStatusCode
@@ -30,9 +31,18 @@ from common.Logger import LogType
 class StateManager:
     # pylint: disable=too-many-instance-attributes
 
-    __slots__ = ['_config', '_current_alarm_state', '_database', '_event_mgr',
-                 '_failed_entry_attempts', '_keypad_api_client', '_logger',
-                 '_transient_states', '_unable_to_conn_error_displayed']
+    __slots__ = ['_clock', '_config', '_database', '_device_zones',
+                 '_event_mgr', '_failed_entry_attempts', '_keypad_api_client',
+                 '_keypad_retry_secs', '_keypad_send_lock', '_logger',
+                 '_transient_states', '_unable_to_conn_error_displayed',
+                 '_zone_states']
+
+    ## Delay (in seconds) before a keypad message that couldn't be sent is
+    #  retried, this doubles for each failed retry up to KeypadRetryMaxSecs.
+    KeypadRetryInitialSecs = 1.0
+
+    ## Maximum delay (in seconds) before a keypad message is retried.
+    KeypadRetryMaxSecs = 30.0
 
 
     ## Alarm state enumeration.
@@ -52,18 +62,54 @@ class StateManager:
     #  @param config Configuration items in json format.
     #  @param eventMgr Event manager instance.
     def __init__(self, controllerDb, config, eventMgr, logger):
+        self._clock = eventMgr.Clock
         self._config = config
-        self._current_alarm_state = self.AlarmState.Deactivated
         self._database = controllerDb
+        self._device_zones = {}
         self._event_mgr = eventMgr
         self._failed_entry_attempts = 0
         self._logger = logger
         self._transient_states = []
         self._unable_to_conn_error_displayed = False
+        self._zone_states = {
+            DevicesConfigLoader.DefaultZone: self.AlarmState.Deactivated
+        }
 
         endpoint = self._config.keypad_controller.endpoint
         self._keypad_api_client = APIEndpointClient(endpoint)
 
+        # The keypad messages are sent by blocking event handlers, which run
+        # concurrently, so sends are serialised as they share the client and
+        # the connection error state.
+        self._keypad_send_lock = threading.Lock()
+
+        # Delay before the next retry of each keypad message, event ID =>
+        # seconds.  A message is removed once it has been sent.
+        self._keypad_retry_secs = {}
+
+
+    ## Set the zones that the devices are in.  Each zone has its own alarm
+    #  state, so zones are armed, disarmed and triggered independently.
+    #  @param self The object pointer.
+    #  @param device_zones Dictionary of device name => zone.
+    def set_device_zones(self, device_zones):
+        self._device_zones = dict(device_zones)
+
+        zones = set(self._device_zones.values()) or \
+            {DevicesConfigLoader.DefaultZone}
+        self._zone_states = {
+            zone: self._zone_states.get(zone, self.AlarmState.Deactivated)
+            for zone in sorted(zones)
+        }
+
+
+    ## Get the zones that are armed (activated or triggered).
+    #  @param self The object pointer.
+    #  @returns List of zone names.
+    def armed_zones(self):
+        return [zone for zone, state in self._zone_states.items()
+                if state != self.AlarmState.Deactivated]
+
 
     ## Received events from the keypad.
     #  @param self The object pointer.
@@ -84,83 +130,104 @@ class StateManager:
     #  @param self The object pointer.
     #  @param eventInst Event class that was created to raise this event.
     def send_alive_ping_msg(self, event):
-
-        additional_headers = {
-            'authorisationKey' : self._config.keypad_controller.authKey
-        }
-
-        response = self._keypad_api_client.SendPostMsg(
-            'receiveCentralControllerPing',
-            MIMEType.JSON,
-            additional_headers, {})
-
-        if response is None:
-            if not self._unable_to_conn_error_displayed:
-                msg = 'Unable to communicate with keypad, reason : ' +\
-                    f'{self._keypad_api_client.LastErrMsg}'
+        with self._keypad_send_lock:
+            additional_headers = {
+                'authorisationKey' : self._config.keypad_controller.authKey
+            }
+
+            response = self._keypad_api_client.SendPostMsg(
+                'receiveCentralControllerPing',
+                MIMEType.JSON,
+                additional_headers, {})
+
+            # The keypad may not be up yet, so keep retrying until it can be
+            # reached, the error is only logged once.
+            if response is None:
+                if not self._unable_to_conn_error_displayed:
+                    msg = 'Unable to communicate with keypad, reason : ' +\
+                        f'{self._keypad_api_client.LastErrMsg}'
+                    self._logger.Log(LogType.Info, msg)
+                    self._unable_to_conn_error_displayed = True
+                self._schedule_keypad_retry(event)
+                return
+
+            self._keypad_retry_secs.pop(event.id, None)
+
+            # 401 Unauthenticated : Missing authentication key.
+            if response.status_code == HTTPStatusCode.Unauthenticated:
+                self._logger.Log(LogType.Critical,
+                                 'Keypad cannot send AlivePing as the ' +\
+                                 'authorisation key is missing')
+                return
+
+            # 403 forbidden : Invalid authentication key.
+            if response.status_code == HTTPStatusCode.Forbidden:
+                self._logger.Log(LogType.Critical,
+                                 'Keypad cannot send AlivePing as the ' +\
+                                 'authorisation key is incorrect')
+                return
+
+            # 200 OK : code accepted, code incorrect or code refused.
+            if response.status_code == HTTPStatusCode.OK:
+                msg = "Successfully send 'AlivePing' to keypad controller"
                 self._logger.Log(LogType.Info, msg)
-                self._event_mgr.QueueEvent(event)
-                self._unable_to_conn_error_displayed = True
-            return
-
-        # 401 Unauthenticated : Missing authentication key.
-        if response.status_code == HTTPStatusCode.Unauthenticated:
-            self._logger.Log(LogType.Critical,
-                             'Keypad cannot send AlivePing as the ' +\
-                             'authorisation key is missing')
-            return
 
-        # 403 forbidden : Invalid authentication key.
-        if response.status_code == HTTPStatusCode.Forbidden:
-            self._logger.Log(LogType.Critical,
-                             'Keypad cannot send AlivePing as the ' +\
-                             'authorisation key is incorrect')
-            return
-
-        # 200 OK : code accepted, code incorrect or code refused.
-        if response.status_code == HTTPStatusCode.OK:
-            msg = "Successfully send 'AlivePing' to keypad controller"
-            self._logger.Log(LogType.Info, msg)
-
-        self._unable_to_conn_error_displayed = False
+            self._unable_to_conn_error_displayed = False
 
 
     def send_keypad_locked_msg(self, event):
-        additional_headers = {
-            'authorisationKey' : self._config.keypad_controller.authKey
-        }
-        json_body = json.dumps(event.body)
-        response = self._keypad_api_client.SendPostMsg('receiveKeypadLock',
-                                                       MIMEType.JSON,
-                                                       additional_headers,
-                                                       json_body)
-
-        if response is None:
-            msg = 'Keypad locked msg : Unable to communicate with keypad, ' +\
-                  f'reason : {self._keypad_api_client.LastErrMsg}'
-            self._logger.Log(LogType.Debug, msg)
-            self._event_mgr.QueueEvent(event)
-            return
-
-        # 401 Unauthenticated : Missing authentication key.
-        if response.status_code == HTTPStatusCode.Unauthenticated:
-            self._logger.Log(LogType.Critical,
-                             'Keypad locked msg : Cannot send the ' +\
-                             'AlivePing as the authorisation key ' +\
-                             'is missing')
-            return
-
-        # 403 forbidden : Invalid authentication key.
-        if response.status_code == HTTPStatusCode.Forbidden:
-            self._logger.Log(LogType.Critical,
-                             'Keypad locked msg : Authorisation ' +\
-                             'key is incorrect')
-            return
-
-        # 200 OK : code accepted, code incorrect or code refused.
-        if response.status_code == HTTPStatusCode.OK:
-            msg = "Successfully sent 'Keypad locked msg' to keypad controller"
-            self._logger.Log(LogType.Debug, msg)
+        with self._keypad_send_lock:
+            additional_headers = {
+                'authorisationKey' : self._config.keypad_controller.authKey
+            }
+            json_body = json.dumps(event.body)
+            response = self._keypad_api_client.SendPostMsg('receiveKeypadLock',
+                                                           MIMEType.JSON,
+                                                           additional_headers,
+                                                           json_body)
+
+            if response is None:
+                msg = 'Keypad locked msg : Unable to communicate with ' +\
+                      f'keypad, reason : {self._keypad_api_client.LastErrMsg}'
+                self._logger.Log(LogType.Debug, msg)
+                self._schedule_keypad_retry(event)
+                return
+
+            self._keypad_retry_secs.pop(event.id, None)
+
+            # 401 Unauthenticated : Missing authentication key.
+            if response.status_code == HTTPStatusCode.Unauthenticated:
+                self._logger.Log(LogType.Critical,
+                                 'Keypad locked msg : Cannot send the ' +\
+                                 'AlivePing as the authorisation key ' +\
+                                 'is missing')
+                return
+
+            # 403 forbidden : Invalid authentication key.
+            if response.status_code == HTTPStatusCode.Forbidden:
+                self._logger.Log(LogType.Critical,
+                                 'Keypad locked msg : Authorisation ' +\
+                                 'key is incorrect')
+                return
+
+            # 200 OK : code accepted, code incorrect or code refused.
+            if response.status_code == HTTPStatusCode.OK:
+                msg = "Successfully sent 'Keypad locked msg' to keypad " +\
+                      'controller'
+                self._logger.Log(LogType.Debug, msg)
+
+
+    ## Schedule another attempt at sending a keypad message that couldn't be
+    #  sent.  The send fails straight away if the keypad isn't listening, so
+    #  retrying immediately would spin, instead the delay is backed off.
+    #  @param self The object pointer.
+    #  @param event Event of the keypad message.
+    def _schedule_keypad_retry(self, event):
+        delay = self._keypad_retry_secs.get(event.id,
+                                            self.KeypadRetryInitialSecs)
+        self._keypad_retry_secs[event.id] = min(delay * 2,
+                                                self.KeypadRetryMaxSecs)
+        self._event_mgr.ScheduleEvent(delay, event)
 
 
     #  @param self The object pointer.
@@ -185,72 +252,132 @@ class StateManager:
         body = event.body
 
         key_sequence = body[schemas.ReceiveKeyCode.BodyElement.KeySeq]
+        zones = self._zones_for_key_code(body)
 
         # Read the key code detail from the database.
         details = self._database.get_keycode_details(key_sequence)
 
         if details is not None:
-            if self._current_alarm_state == self.AlarmState.Triggered:
-                self._logger.Log(LogType.Info, 'A triggered alarm has been deactivated')
-                self._current_alarm_state = self.AlarmState.Deactivated
-                self._failed_entry_attempts = 0
-                evt = Event(Evts.EvtType.DeactivateSiren, None)
-                self._event_mgr.QueueEvent(evt)
-                self._deactivate_alarm()
+            self._failed_entry_attempts = 0
+            self._arm_or_disarm_zones(zones)
+            return
+
+        self._logger.Log(LogType.Info,
+                         'An invalid key code was entered on keypad')
+        self._failed_entry_attempts += 1
+
+        attempts = self._failed_entry_attempts
+
+        # If the attempt failed then send the response of type
+        # receiveKeyCodeResponseAction_KeycodeIncorrect along with any
+        # response actions that have been defined in the configuraution
+        # file.
+        if attempts in self._config.failed_attempt_responses:
+            self._handle_failed_attempt_responses(
+                self._config.failed_attempt_responses[attempts], zones)
 
-            elif self._current_alarm_state == self.AlarmState.Deactivated:
-                self._logger.Log(LogType.Info, 'The alarm has been activated')
-                self._current_alarm_state = self.AlarmState.Activated
-                self._failed_entry_attempts = 0
-                self._trigger_alarm()
 
-            elif self._current_alarm_state == self.AlarmState.Activated:
-                self._logger.Log(LogType.Info, 'The alarm has been deactivated')
-                self._current_alarm_state = self.AlarmState.Deactivated
+    ## A valid key code has been entered, if any of the zones are armed then
+    #  the key code disarms them, otherwise it arms all of the zones.
+    #  @param self The object pointer.
+    #  @param zones Zones the key code applies to.
+    def _arm_or_disarm_zones(self, zones):
+        if any(self._zone_states[zone] != self.AlarmState.Deactivated
+               for zone in zones):
+            for zone in zones:
+                self._disarm_zone(zone)
+
+            return
+
+        for zone in zones:
+            self._logger.Log(LogType.Info,
+                             "Zone '%s' : The alarm has been activated", zone)
+            self._trigger_alarm(zone)
+
+
+    ## Carry out the response actions configured for the number of failed
+    #  key code entry attempts.
+    #  @param self The object pointer.
+    #  @param responses Response actions, action name => parameters.
+    #  @param zones Zones the key code applies to.
+    def _handle_failed_attempt_responses(self, responses, zones):
+        for response in responses:
+
+            if response == 'disableKeyPad':
+                lock_event_body = {
+                    keypadApi.KeypadLockRequest.BodyElement.LockTime:
+                    round(self._clock.Time()) +
+                    int(responses[response]['lockTime'])
+                }
+                lock_event = Event(Evts.EvtType.KeypadApiSendKeypadLock,
+                                   lock_event_body)
+                self._event_mgr.QueueEvent(lock_event)
+
+            elif response == 'triggerAlarm':
+                for zone in zones:
+                    if self._zone_states[zone] != self.AlarmState.Triggered:
+                        self._logger.Log(LogType.Info,
+                                         "Zone '%s' : |=> Alarm has been " +
+                                         "triggered!", zone)
+                        self._trigger_alarm(zone, no_grace_time=True)
+
+            elif response == 'resetAttemptAccount':
                 self._failed_entry_attempts = 0
-                self._deactivate_alarm()
 
-        else:
-            self._logger.Log(LogType.Info, 'An invalid key code was entered on keypad')
-            self._failed_entry_attempts += 1
 
-            attempts = self._failed_entry_attempts
+    ## Get the zones that a key code applies to, either the zone given in the
+    #  key code message or every zone if it doesn't give one.
+    #  @param self The object pointer.
+    #  @param body Body of the key code event.
+    #  @returns List of zones.
+    def _zones_for_key_code(self, body):
+        zone = body.get(schemas.ReceiveKeyCode.BodyElement.Zone)
+
+        if zone is None:
+            return list(self._zone_states)
 
-            # If the attempt failed then send the response of type
-            # receiveKeyCodeResponseAction_KeycodeIncorrect along with any
-            # response actions that have been defined in the configuraution
-            # file.
-            if attempts in self._config.failed_attempt_responses:
-                responses = self._config.failed_attempt_responses[attempts]
+        if zone not in self._zone_states:
+            self._logger.Log(LogType.Warn,
+                             "Key code entered for unknown zone '%s'", zone)
+            return []
 
-                for response in responses:
+        return [zone]
 
-                    if response == 'disableKeyPad':
-                        lock_event_body = {
-                            keypadApi.KeypadLockRequest.BodyElement.LockTime:
-                            round(time.time()) + int(responses[response]['lockTime'])
-                        }
-                        lock_event = Event(Evts.EvtType.KeypadApiSendKeypadLock,
-                                           lock_event_body)
-                        self._event_mgr.QueueEvent(lock_event)
 
-                    elif response == 'triggerAlarm':
-                        if self._current_alarm_state != self.AlarmState.Triggered:
-                            self._logger.Log(LogType.Info, '|=> Alarm has been triggered!')
-                            self._trigger_alarm(no_grace_time=True)
+    ## Disarm a zone, if the zone has been triggered then its sirens are
+    #  also deactivated.
+    #  @param self The object pointer.
+    #  @param zone Zone to disarm.
+    def _disarm_zone(self, zone):
+        zone_state = self._zone_states[zone]
+
+        if zone_state == self.AlarmState.Triggered:
+            self._logger.Log(LogType.Info,
+                             "Zone '%s' : A triggered alarm has been deactivated",
+                             zone)
+            evt = Event(Evts.EvtType.DeactivateSiren,
+                        {Evts.AlarmZoneBodyItem.Zone: zone})
+            self._event_mgr.QueueEvent(evt)
+            self._deactivate_alarm(zone)
 
-                    elif response == 'resetAttemptAccount':
-                        self._failed_entry_attempts = 0
+        elif zone_state == self.AlarmState.Activated:
+            self._logger.Log(LogType.Info,
+                             "Zone '%s' : The alarm has been deactivated",
+                             zone)
+            self._deactivate_alarm(zone)
 
 
     ## Function to handle the alarm being triggered.
     #  @param self The object pointer.
-    def _trigger_alarm(self, no_grace_time=False):
-        self._current_alarm_state = self.AlarmState.Activated
+    #  @param zone Zone the alarm is activated in.
+    #  @param no_grace_time True if the sensors get no grace period.
+    def _trigger_alarm(self, zone, no_grace_time=False):
+        self._zone_states[zone] = self.AlarmState.Activated
 
         alarm_set_evt_body = {
-            'activationTimestamp': time.time(),
-            'noGraceTime': no_grace_time
+            'activationTimestamp': self._clock.Time(),
+            'noGraceTime': no_grace_time,
+            Evts.AlarmZoneBodyItem.Zone: zone
         }
 
         activate_event = Event(Evts.EvtType.AlarmActivated, alarm_set_evt_body)
@@ -259,11 +386,13 @@ class StateManager:
 
     ## Function to handle the alarm being deactivated.
     #  @param self The object pointer.
-    def _deactivate_alarm(self):
-        self._current_alarm_state = self.AlarmState.Deactivated
+    #  @param zone Zone the alarm is deactivated in.
+    def _deactivate_alarm(self, zone):
+        self._zone_states[zone] = self.AlarmState.Deactivated
         self._failed_entry_attempts = 0
 
-        evt = Event(Evts.EvtType.AlarmDeactivated)
+        evt = Event(Evts.EvtType.AlarmDeactivated,
+                    {Evts.AlarmZoneBodyItem.Zone: zone})
         self._event_mgr.QueueEvent(evt)
 
 
@@ -278,9 +407,13 @@ class StateManager:
         triggered = bool(state == 1)
         state_str = "opened" if triggered else "closed"
 
+        zone = self._device_zones.get(device_name,
+                                      DevicesConfigLoader.DefaultZone)
+        zone_state = self._zone_states.get(zone, self.AlarmState.Deactivated)
+
         # If the alarm is deactived then ignore the sensor state change after
         # logging the change for reference.
-        if self._current_alarm_state == self.AlarmState.Deactivated:
+        if zone_state == self.AlarmState.Deactivated:
             log_msg = f"{device_name} was {state_str}, although alarm isn't on"
             self._logger.Log(LogType.Info, log_msg)
             return
@@ -288,16 +421,17 @@ class StateManager:
         # If the trigger has has already been triggered then opening or closing
         # a door etc. would change the alarm state, although we should log that
         # the even occurred.
-        if self._current_alarm_state == self.AlarmState.Triggered:
+        if zone_state == self.AlarmState.Triggered:
             log_msg = f"{device_name} was {state_str}, alarm already triggered"
             self._logger.Log(LogType.Info, log_msg)
             return
 
-        if self._current_alarm_state == self.AlarmState.Activated:
+        if zone_state == self.AlarmState.Activated:
             log_msg = f"Activity on {device_name} ({state_str}) has triggerd " +\
-                "the alarm!"
+                f"the alarm in zone '{zone}'!"
             self._logger.Log(LogType.Info, log_msg)
-            self._current_alarm_state = self.AlarmState.Triggered
+            self._zone_states[zone] = self.AlarmState.Triggered
 
-            evt = Event(Evts.EvtType.ActivateSiren, None)
+            evt = Event(Evts.EvtType.ActivateSiren,
+                        {Evts.AlarmZoneBodyItem.Zone: zone})
             self._event_mgr.QueueEvent(evt)
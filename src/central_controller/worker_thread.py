@@ -15,17 +15,24 @@ limitations under the License.
 '''
 import enum
 import threading
-import time
 from common.Logger import LogType
 
 
 ## Main worker thread for the central controller.
 class WorkerThread(threading.Thread):
+    # pylint: disable=too-many-instance-attributes
 
     class IOPinState(enum.Enum):
         High = 0
         Low = 1
 
+    ## Maximum number of events dispatched per loop iteration, None will
+    #  drain everything that is pending.
+    EventBudgetPerTick = None
+
+    ## Interval (in seconds) between scans of the hardware devices.
+    HardwareScanInterval = 0.1
+
     ## Property getter : Last error message
     @property
     def shutdown_completed(self):
@@ -38,14 +45,19 @@ class WorkerThread(threading.Thread):
     #  @param deviceManager Device hardware management class.
     #  @param eventManager Event management class instance.
     #  @param stateMsr Statement management class instance.
-    def __init__(self, config, deviceManager, eventManager, stateMsr, logger):
+    #  @param logger Logger instance.
+    #  @param scenarioPlayer Optional emulator scenario player.
+    def __init__(self, config, deviceManager, eventManager, stateMsr, logger,
+                 scenarioPlayer=None):
         # pylint: disable=too-many-arguments
 
         threading.Thread.__init__(self)
+        self._clock = eventManager.Clock
         self._config = config
         self._device_manager = deviceManager
         self._event_manager = eventManager
         self._logger = logger
+        self._scenario_player = scenarioPlayer
         self._shutdown_requested = False
         self._shutdown_completed = False
         self._state_mgr = stateMsr
@@ -56,11 +68,31 @@ class WorkerThread(threading.Thread):
     def run(self):
         self._logger.Log(LogType.Info, 'starting IO processing thread')
 
+        next_scan_time = self._clock.Monotonic()
+
+        if self._scenario_player:
+            self._scenario_player.start()
+
         while not self._shutdown_requested:
-            self._state_mgr.update_transitory_events()
-            self._device_manager.check_hardware_devices()
-            self._event_manager.ProcessNextEvent()
-            time.sleep(0.1)
+            if self._scenario_player:
+                self._scenario_player.play_due_steps()
+
+            if self._clock.Monotonic() >= next_scan_time:
+                self._state_mgr.update_transitory_events()
+                self._device_manager.check_hardware_devices()
+                next_scan_time = self._clock.Monotonic() + \
+                    self.HardwareScanInterval
+
+            self._event_manager.ProcessAllEvents(self.EventBudgetPerTick)
+
+            # Sleep until either an event is queued or the next deadline (the
+            # next hardware scan or scenario step) is due.
+            deadline = next_scan_time
+            if self._scenario_player and self._scenario_player.next_step_time:
+                deadline = min(deadline, self._scenario_player.next_step_time)
+
+            timeout = max(0.0, deadline - self._clock.Monotonic())
+            self._event_manager.WaitForEvent(timeout)
 
         self._shutdown_completed = True
 
@@ -68,3 +100,4 @@ class WorkerThread(threading.Thread):
     #  @param self The object pointer.
     def signal_shutdown_requested(self):
         self._shutdown_requested = True
+        self._event_manager.WakeDispatcher()
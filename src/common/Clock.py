@@ -0,0 +1,182 @@
+'''
+Copyright 2019 Secure Shed Project Dev Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+import math
+import threading
+import time
+
+
+## Clock service, everything that measures time, sleeps or sets a timer should
+#  do so through a clock so that simulations can run faster than real time or
+#  step time deterministically.  This is the system clock, which is what is
+#  used in production.
+class SystemClock:
+
+    ## Current wall clock time.
+    #  @param self The object pointer.
+    #  @returns Seconds since the epoch.
+    def Time(self):
+        # pylint: disable=no-self-use
+        return time.time()
+
+
+    ## Current monotonic time, for measuring intervals and deadlines.
+    #  @param self The object pointer.
+    #  @returns Monotonic time in seconds.
+    def Monotonic(self):
+        # pylint: disable=no-self-use
+        return time.monotonic()
+
+
+    ## Sleep for a period of clock time.
+    #  @param self The object pointer.
+    #  @param secs Seconds of clock time to sleep for.
+    def Sleep(self, secs):
+        time.sleep(self.RealTimeout(secs))
+
+
+    ## Convert a period of clock time into the real time that a thread should
+    #  wait for (e.g. a condition variable or reactor timeout).
+    #  @param self The object pointer.
+    #  @param secs Seconds of clock time, None = forever.
+    #  @returns Seconds of real time, None = forever.
+    def RealTimeout(self, secs):
+        # pylint: disable=no-self-use
+        return secs
+
+
+## Clock that runs faster (or slower) than real time, e.g. a speed of 100 makes
+#  a 30 second grace period expire after 0.3 seconds.  At the anchor time the
+#  clock reads the same as the system clock, so processes that share an anchor
+#  and speed agree on the time.
+class AcceleratedClock(SystemClock):
+    __slots__ = ['_anchor', '_monotonic_anchor', '_speed']
+
+    ## Property getter : Speed relative to real time.
+    @property
+    def Speed(self):
+        return self._speed
+
+
+    ## AcceleratedClock class constructor.
+    #  @param self The object pointer.
+    #  @param speed Speed relative to real time, must be greater than 0.
+    #  @param anchor Wall clock time at which the clock matches the system
+    #         clock, None = now.
+    def __init__(self, speed, anchor=None):
+        if not 0 < speed < math.inf:
+            raise ValueError('Clock speed must be a number greater than 0')
+
+        self._speed = speed
+        self._anchor = time.time() if anchor is None else anchor
+        self._monotonic_anchor = time.monotonic()
+
+
+    ## Current wall clock time.
+    #  @param self The object pointer.
+    #  @returns Seconds since the epoch.
+    def Time(self):
+        return self._anchor + ((time.time() - self._anchor) * self._speed)
+
+
+    ## Current monotonic time, for measuring intervals and deadlines.
+    #  @param self The object pointer.
+    #  @returns Monotonic time in seconds.
+    def Monotonic(self):
+        return self._monotonic_anchor + \
+            ((time.monotonic() - self._monotonic_anchor) * self._speed)
+
+
+    ## Convert a period of clock time into the real time that a thread should
+    #  wait for.
+    #  @param self The object pointer.
+    #  @param secs Seconds of clock time, None = forever.
+    #  @returns Seconds of real time, None = forever.
+    def RealTimeout(self, secs):
+        return None if secs is None else secs / self._speed
+
+
+## Clock that only moves when it is advanced, for stepping through scenarios
+#  deterministically.  Waits are turned into short real time polls so that
+#  threads waiting on a deadline notice when the clock has been advanced.
+class ManualClock(SystemClock):
+    __slots__ = ['_lock', '_now']
+
+    ## Real time (in seconds) that a wait on a deadline lasts for before the
+    #  waiter checks the clock again.
+    PollInterval = 0.01
+
+    ## ManualClock class constructor.
+    #  @param self The object pointer.
+    #  @param startTime Starting time in seconds since the epoch, None = now.
+    def __init__(self, startTime=None):
+        self._lock = threading.Lock()
+        self._now = time.time() if startTime is None else startTime
+
+
+    ## Move the clock forward.
+    #  @param self The object pointer.
+    #  @param secs Seconds to advance the clock by.
+    def Advance(self, secs):
+        with self._lock:
+            self._now += max(0.0, secs)
+
+
+    ## Current wall clock time.
+    #  @param self The object pointer.
+    #  @returns Seconds since the epoch.
+    def Time(self):
+        return self._now
+
+
+    ## Current monotonic time, for a manual clock this is the same as Time().
+    #  @param self The object pointer.
+    #  @returns Monotonic time in seconds.
+    def Monotonic(self):
+        return self._now
+
+
+    ## Sleeping advances the clock rather than blocking.
+    #  @param self The object pointer.
+    #  @param secs Seconds of clock time to sleep for.
+    def Sleep(self, secs):
+        self.Advance(secs)
+
+
+    ## Convert a period of clock time into the real time that a thread should
+    #  wait for.
+    #  @param self The object pointer.
+    #  @param secs Seconds of clock time, None = forever.
+    #  @returns Seconds of real time, None = forever.
+    def RealTimeout(self, secs):
+        return None if secs is None else min(secs, self.PollInterval)
+
+
+## Create the clock from a speed setting (e.g. an environment variable).
+#  @param speed Speed relative to real time as a string or number, None or
+#         empty for the system clock.  A ManualClock is only advanced by
+#         whoever owns it, so it is never created from a setting.
+#  @param anchor Optional wall clock anchor for an accelerated clock.
+#  @returns Clock instance.
+#  @throws ValueError if the speed is invalid.
+def CreateClock(speed=None, anchor=None):
+    if not speed:
+        return SystemClock()
+
+    speed = float(speed)
+    if speed == 1.0 and anchor is None:
+        return SystemClock()
+
+    return AcceleratedClock(speed, None if anchor is None else float(anchor))
@@ -13,7 +13,12 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 '''
+import collections
+import concurrent.futures
 import enum
+import threading
+from common.Clock import SystemClock
+from common.EventScheduler import EventScheduler
 
 
 ## <Description go here>
@@ -21,25 +26,126 @@ class EventManagerStatusCode(enum.Enum):
     Success = 0
     InvalidEventID = 1
     EventManagerDisabled = 2
+    EventQueueFull = 3
 
 
-## Event Manager implementation.
+## Policy applied when an event is queued and the event queue is at its
+#  maximum capacity.
+class EventQueueOverflowPolicy(enum.Enum):
+    ## Discard the oldest queued event to make room for the new one.
+    DropOldest = 0
+
+    ## Discard the new event, the queue is left untouched.
+    DropNewest = 1
+
+    ## Block the caller until the dispatcher has made room.  Only the
+    #  dispatcher can make room, so an event queued on the dispatcher thread
+    #  (e.g. by a handler or a scheduled event) is never blocked, it fails
+    #  with EventManagerStatusCode.EventQueueFull instead.
+    Block = 2
+
+
+## Policy for collapsing multiple pending events of the same ID, this is
+#  intended for idempotent events where only one needs to be dispatched.
+class EventCoalescingPolicy(enum.Enum):
+    ## Every event is queued (default).
+    Disabled = 0
+
+    ## If an event with the same ID is pending then the new event is dropped.
+    AtMostOnePending = 1
+
+    ## If an event with the same ID is pending then the new event replaces it,
+    #  keeping the position in the queue of the pending event.
+    ReplacePending = 2
+
+
+## Dispatch priority of an event, each priority has its own queue (lane) and
+#  the highest priority lane that has events pending is always served first.
+class EventPriority(enum.Enum):
+    High = 0
+    Normal = 1
+    Low = 2
+
+
+## Event Manager implementation.  Events can be queued from any number of
+#  threads (e.g. Flask request threads and the worker thread), they are
+#  dispatched by a single consumer thread.  Handlers are always called without
+#  any internal lock being held, so producers never wait on a handler.
 class EventManager:
+    # pylint: disable=too-many-instance-attributes
+
+    ## Subscription of a callback to an event ID.
+    Subscriber = collections.namedtuple('Subscriber',
+                                        'callback blocking onComplete')
+
+    ## Default maximum number of threads used to run blocking handlers.
+    DefaultMaxBlockingWorkers = 2
+
+    ## Default number of times a non-empty lane can be passed over for a
+    #  higher priority lane before it is served anyway.
+    DefaultStarvationLimit = 16
+
+    ## Property getter : Clock used by the event manager, this is shared with
+    #  anything that needs to agree with it on the time (e.g. device plug-ins).
+    @property
+    def Clock(self):
+        return self._clock
+
 
     ## <Description go here>
     #  @param self The object pointer.
-    def __init__(self):
+    #  @param maxQueueSize Maximum number of queued events, None = unbounded.
+    #  @param overflowPolicy Action taken when the queue is full.
+    #  @param eventPriorities Dictionary of event ID to EventPriority, any
+    #         event ID not in the dictionary is EventPriority.Normal.
+    #  @param starvationLimit Times a lane can be passed over before it is
+    #         served regardless of the higher priority lanes.
+    #  @param maxBlockingWorkers Size of the thread pool for blocking handlers.
+    #  @param coalescingPolicies Dictionary of event ID to
+    #         EventCoalescingPolicy, any event ID not in the dictionary is
+    #         never coalesced.
+    #  @param clock Clock used for scheduled events and waits, None = system
+    #         clock.
+    def __init__(self, maxQueueSize=None,
+                 overflowPolicy=EventQueueOverflowPolicy.DropOldest,
+                 eventPriorities=None,
+                 starvationLimit=DefaultStarvationLimit,
+                 maxBlockingWorkers=DefaultMaxBlockingWorkers,
+                 coalescingPolicies=None, clock=None):
+        # pylint: disable=too-many-arguments
+        self._blockingExecutor = None
+        self._clock = clock or SystemClock()
+        self._coalescingPolicies = dict(coalescingPolicies or {})
+        self._coalescedEvents = {}
+        self._completions = collections.deque()
         self._enabled = True
         self._eventHandlers = {}
-        self._events = []
+        self._eventPriorities = dict(eventPriorities or {})
+        self._lanes = [collections.deque() for _ in EventPriority]
+        self._laneSkips = [0 for _ in EventPriority]
+        self._maxBlockingWorkers = maxBlockingWorkers
+        self._queuedCount = 0
+        self._starvationLimit = starvationLimit
+        self._maxQueueSize = maxQueueSize
+        self._overflowPolicy = overflowPolicy
+        self._queueLock = threading.Lock()
+        self._queueNotEmpty = threading.Condition(self._queueLock)
+        self._queueNotFull = threading.Condition(self._queueLock)
+        self._registrationLock = threading.Lock()
+        self._scheduler = EventScheduler()
+        self._dispatcherThread = None
+        self._dispatcherWaiting = False
+        self._producersWaiting = 0
+        self._wakeRequested = False
 
 
-    ## Queue a new event.
+    ## Queue a new event, this is safe to call from any thread.
     #  @param self The object pointer.
     #  @param event Event to queue.
     #  @returns Return codes:
     #    EventManagerStatusCode.Success
     #    EventManagerStatusCode.InvalidEventID
+    #    EventManagerStatusCode.EventQueueFull
     def QueueEvent(self, event):
         # Only queue the event, if event manager is enabled (running)
         if not self._enabled:
@@ -51,22 +157,164 @@ class EventManager:
         if not self.IsValidEventType(event.id):
             return EventManagerStatusCode.InvalidEventID
 
-        # Add the event into the queue.
-        self._events.append(event)
+        # The lock is only ever held for a few deque operations, the
+        # dispatcher never holds it whilst an event handler is running.
+        with self._queueLock:
+            policy = self._coalescingPolicies.get(event.id)
+            coalesced = policy is not None and \
+                policy != EventCoalescingPolicy.Disabled
+
+            while True:
+                # If the event is coalesced and one with the same ID is
+                # already pending then it collapses into the pending one.
+                if coalesced and event.id in self._coalescedEvents:
+                    if policy == EventCoalescingPolicy.ReplacePending:
+                        self._coalescedEvents[event.id] = event
+
+                    return EventManagerStatusCode.Success
+
+                if self._maxQueueSize is None or \
+                   self._queuedCount < self._maxQueueSize:
+                    break
+
+                if self._overflowPolicy == EventQueueOverflowPolicy.DropNewest:
+                    return EventManagerStatusCode.EventQueueFull
+
+                if self._overflowPolicy == EventQueueOverflowPolicy.DropOldest:
+                    self._drop_oldest_event()
+                    break
+
+                # Waiting on the dispatcher thread would never end as it is
+                # the only thing that makes room.
+                if threading.get_ident() == self._dispatcherThread:
+                    return EventManagerStatusCode.EventQueueFull
+
+                # The lock is released whilst waiting, so the coalescing
+                # check is repeated as an event with the same ID may have
+                # been queued in the meantime.
+                self._producersWaiting += 1
+                self._queueNotFull.wait_for(
+                    lambda: self._queuedCount < self._maxQueueSize)
+                self._producersWaiting -= 1
+
+            # Add the event into its priority lane, only signalling the
+            # dispatcher if it is actually asleep waiting for an event.  A
+            # coalesced event is only marked as pending once it is queued.
+            priority = self._eventPriorities.get(event.id,
+                                                 EventPriority.Normal)
+            self._lanes[priority.value].append(event)
+            self._queuedCount += 1
+
+            if coalesced:
+                self._coalescedEvents[event.id] = event
+
+            if self._dispatcherWaiting:
+                self._queueNotEmpty.notify()
 
         # Return 'success' status.
         return EventManagerStatusCode.Success
 
 
-    ## Register an event with the event manager.
+    ## Register an event with the event manager, an event can have any number
+    #  of subscribers and they are called in the order they registered.  The
+    #  dispatch table maps each event ID to a tuple of subscribers and is
+    #  copied on write so that dispatching and validation can read it
+    #  lock-free.
+    #
+    #  A callback that blocks (e.g. makes a network request) should be
+    #  registered with blocking=True, it is then run on a bounded thread pool
+    #  so that it cannot hold up the dispatch of other events.  Once it has
+    #  finished, onComplete(event, result) is called on the dispatcher thread.
     #  @param self The object pointer.
     #  @param eventID ID of event to register.
     #  @param callback Event callback function.
-    def RegisterEvent(self, eventID, callback):
-        if eventID in self._eventHandlers:
-            return
+    #  @param blocking Run the callback on the blocking handler thread pool.
+    #  @param onComplete Optional completion callback for blocking callbacks.
+    def RegisterEvent(self, eventID, callback, blocking=False,
+                      onComplete=None):
+        with self._registrationLock:
+            subscribers = self._eventHandlers.get(eventID, ())
+
+            if any(sub.callback == callback for sub in subscribers):
+                return
+
+            handlers = dict(self._eventHandlers)
+            handlers[eventID] = subscribers + \
+                (self.Subscriber(callback, blocking, onComplete),)
+            self._eventHandlers = handlers
+
+
+    ## Schedule an event to be queued once a delay has elapsed, this is safe to
+    #  call from any thread.  The dispatcher is woken at the deadline so there
+    #  is no need for anything to poll for timeouts.
+    #  @param self The object pointer.
+    #  @param delay Delay in seconds before the event is queued.
+    #  @param event Event to queue.
+    #  @returns Timer ID (to use with CancelScheduledEvent) or None if the
+    #           event manager is disabled or the event ID is invalid.
+    def ScheduleEvent(self, delay, event):
+        if not self._enabled or not self.IsValidEventType(event.id):
+            return None
+
+        deadline = self._clock.Monotonic() + max(0.0, delay)
+
+        with self._queueLock:
+            next_deadline = self._scheduler.NextDeadline()
+            timer_id = self._scheduler.Schedule(deadline, event)
+
+            # Wake the dispatcher so that it shortens its wait if this is now
+            # the earliest deadline.
+            if self._dispatcherWaiting and \
+               (next_deadline is None or deadline < next_deadline):
+                self._queueNotEmpty.notify()
 
-        self._eventHandlers[eventID] = callback
+        return timer_id
+
+
+    ## Cancel an event that was scheduled using ScheduleEvent().
+    #  @param self The object pointer.
+    #  @param timerId Timer ID returned by ScheduleEvent().
+    #  @returns True if cancelled, False if it has already been queued.
+    def CancelScheduledEvent(self, timerId):
+        with self._queueLock:
+            return self._scheduler.Cancel(timerId)
+
+
+    ## Set how pending events with the given ID are coalesced.
+    #  @param self The object pointer.
+    #  @param eventID ID of event to set the policy for.
+    #  @param policy EventCoalescingPolicy to apply.
+    def SetCoalescingPolicy(self, eventID, policy):
+        with self._queueLock:
+            self._coalescingPolicies[eventID] = policy
+
+
+    ## Remove a subscription that was added using RegisterEvent(), once the
+    #  last subscriber for an event is removed the event ID is no longer valid.
+    #  @param self The object pointer.
+    #  @param eventID ID of event to unregister from.
+    #  @param callback Event callback function to remove.
+    #  @returns True if the subscription was removed, False if not found.
+    def UnregisterEvent(self, eventID, callback):
+        with self._registrationLock:
+            subscribers = self._eventHandlers.get(eventID, ())
+
+            if not any(sub.callback == callback for sub in subscribers):
+                return False
+
+            handlers = dict(self._eventHandlers)
+            remaining = tuple(sub for sub in subscribers
+                              if sub.callback != callback)
+
+            if remaining:
+                handlers[eventID] = remaining
+
+            else:
+                del handlers[eventID]
+
+            self._eventHandlers = handlers
+
+        return True
 
 
     ## Process the next event, if any exists.  An error will be generated if
@@ -76,34 +324,104 @@ class EventManager:
     #    EventManagerStatusCode.Success
     #    EventManagerStatusCode.InvalidEventID
     def ProcessNextEvent(self):
+        self._dispatcherThread = threading.get_ident()
+        self._process_completions()
+        self._queue_due_events()
+
+        events = self._take_events(1)
+
         # If nothing is ready for processing, return 0 (success)
-        if not self._events:
+        if not events:
             return EventManagerStatusCode.Success
 
-        #  Get the first event from the list.
-        event = self._events[0]
+        return self._dispatch_event(events[0])
 
-        # Check to see event ID is valid, if an unknown event ID then return
-        # the 'invalid event id' error.
-        if event.id not in self._eventHandlers:
-            return EventManagerStatusCode.InvalidEventID
 
-        #  Call the event processing function, this is defined by the
-        #  registered callback function.
-        self._eventHandlers[event.id](event)
+    ## Process all of the events that are pending, up to an optional budget.
+    #  Only the events that are queued when the call is made are processed,
+    #  events queued by a handler are left for the next call so that an event
+    #  which re-queues itself cannot stall the caller.
+    #  @param self The object pointer.
+    #  @param maxEvents Maximum number of events to process, None = no limit.
+    #  @returns Number of events that were processed.
+    def ProcessAllEvents(self, maxEvents=None):
+        self._dispatcherThread = threading.get_ident()
+        self._process_completions()
+        self._queue_due_events()
+
+        events = self._take_events(maxEvents)
 
-        #  Once the event has been handled, delete it.. The event handler
-        # function should deal with issues with the event and therefore
-        #  deleting should be safe.
-        self._events.pop(0)
+        for index, event in enumerate(events):
+            try:
+                self._dispatch_event(event)
 
-        # Return 'success' status.
-        return EventManagerStatusCode.Success
+            # The batch has already been taken off the queue, so if a handler
+            # raises then the events not yet dispatched are put back before
+            # the exception is passed on.
+            except Exception:
+                self._requeue_events(events[index + 1:])
+                raise
+
+        return len(events)
+
+
+    ## Block the caller until an event is queued, a scheduled event is due, a
+    #  blocking handler completes, WakeDispatcher() is called or the timeout
+    #  expires, whichever happens first.
+    #  @param self The object pointer.
+    #  @param timeout Maximum time to wait in seconds of clock time, None =
+    #         wait forever.
+    #  @returns True if there are events pending, otherwise False.
+    def WaitForEvent(self, timeout=None):
+        self._dispatcherThread = threading.get_ident()
+
+        with self._queueLock:
+            if not self._queuedCount and not self._completions and \
+               not self._wakeRequested:
+                self._dispatcherWaiting = True
+                timeout = self._cap_timeout_to_deadline(timeout)
+                self._queueNotEmpty.wait(self._clock.RealTimeout(timeout))
+                self._dispatcherWaiting = False
+
+            self._wakeRequested = False
+            next_deadline = self._scheduler.NextDeadline()
+            timer_due = next_deadline is not None and \
+                next_deadline <= self._clock.Monotonic()
+            return self._queuedCount > 0 or bool(self._completions) or \
+                timer_due
+
+
+    ## Wake up a dispatcher that is blocked in WaitForEvent(), e.g. so that it
+    #  can see that a shutdown has been requested.
+    #  @param self The object pointer.
+    def WakeDispatcher(self):
+        with self._queueLock:
+            self._wakeRequested = True
+            self._queueNotEmpty.notify_all()
+
+
+    ## Stop accepting new events and shut down the blocking handler thread
+    #  pool, any blocking handlers that are still running are left to finish.
+    #  @param self The object pointer.
+    def Shutdown(self):
+        self._enabled = False
+
+        if self._blockingExecutor is not None:
+            self._blockingExecutor.shutdown(wait=False)
+            self._blockingExecutor = None
 
 
     ## Delete all events.
     def DeleteAllEvents(self):
-        del self._events[:]
+        with self._queueLock:
+            for lane in self._lanes:
+                lane.clear()
+
+            self._laneSkips = [0 for _ in self._lanes]
+            self._coalescedEvents.clear()
+            self._scheduler.Clear()
+            self._queuedCount = 0
+            self._queueNotFull.notify_all()
 
 
     ## Check if an event is valid.
@@ -111,3 +429,192 @@ class EventManager:
     # @returns Return codes: Valid = True.  Invalid = False.
     def IsValidEventType(self, eventID):
         return eventID in self._eventHandlers
+
+
+    ## Limit a wait timeout so that the wait ends when the next scheduled event
+    #  is due.  Must be called with the queue lock held.
+    #  @param self The object pointer.
+    #  @param timeout Requested timeout in seconds, None = wait forever.
+    #  @returns Timeout to wait for in seconds, None = wait forever.
+    def _cap_timeout_to_deadline(self, timeout):
+        next_deadline = self._scheduler.NextDeadline()
+
+        if next_deadline is None:
+            return timeout
+
+        until_deadline = max(0.0, next_deadline - self._clock.Monotonic())
+        return until_deadline if timeout is None \
+            else min(timeout, until_deadline)
+
+
+    ## Move any scheduled events whose deadline has been reached into the
+    #  event queue.
+    #  @param self The object pointer.
+    def _queue_due_events(self):
+        with self._queueLock:
+            due_events = self._scheduler.PopDueEvents(self._clock.Monotonic())
+
+        for event in due_events:
+            self.QueueEvent(event)
+
+
+    ## Remove up to maxEvents events from the priority lanes in a single lock
+    #  acquisition, in the order they should be dispatched.
+    #  @param self The object pointer.
+    #  @param maxEvents Maximum number of events to remove, None = all.
+    #  @returns List of the removed events.
+    def _take_events(self, maxEvents):
+        with self._queueLock:
+            count = self._queuedCount
+
+            if maxEvents is not None:
+                count = min(count, maxEvents)
+
+            events = [self._lanes[self._select_lane()].popleft()
+                      for _ in range(count)]
+            self._queuedCount -= count
+
+            # A coalesced event may have been replaced whilst pending, the
+            # queued event only holds its position in the queue.
+            if self._coalescedEvents:
+                events = [self._coalescedEvents.pop(evt.id, evt)
+                          for evt in events]
+
+            # Wake up any producer that is blocked waiting for room.
+            if count and self._producersWaiting:
+                self._queueNotFull.notify(count)
+
+        return events
+
+
+    ## Put events that were taken from the queue but not dispatched back at
+    #  the front of their lanes, in their original order.  A coalesced event
+    #  is dropped if another with the same ID has been queued since.
+    #  @param self The object pointer.
+    #  @param events Events to put back, in dispatch order.
+    def _requeue_events(self, events):
+        with self._queueLock:
+            for event in reversed(events):
+                policy = self._coalescingPolicies.get(event.id)
+
+                if policy is not None and \
+                   policy != EventCoalescingPolicy.Disabled:
+                    if event.id in self._coalescedEvents:
+                        continue
+
+                    self._coalescedEvents[event.id] = event
+
+                priority = self._eventPriorities.get(event.id,
+                                                     EventPriority.Normal)
+                self._lanes[priority.value].appendleft(event)
+                self._queuedCount += 1
+
+
+    ## Select the lane that the next event should be taken from, this is the
+    #  highest priority non-empty lane unless a lower priority lane has been
+    #  passed over too many times, in which case it is served instead.  Must
+    #  be called with the queue lock held and at least one event queued.
+    #  @param self The object pointer.
+    #  @returns Index of the selected lane.
+    def _select_lane(self):
+        selected = None
+
+        for lane_no, lane in enumerate(self._lanes):
+            if not lane:
+                continue
+
+            if selected is None:
+                selected = lane_no
+
+            elif self._laneSkips[lane_no] >= self._starvationLimit:
+                selected = lane_no
+                break
+
+        for lane_no, lane in enumerate(self._lanes):
+            if lane_no == selected:
+                self._laneSkips[lane_no] = 0
+
+            elif lane:
+                self._laneSkips[lane_no] += 1
+
+        return selected
+
+
+    ## Drop the oldest event from the lowest priority non-empty lane to make
+    #  room for a new event.  Must be called with the queue lock held.
+    #  @param self The object pointer.
+    def _drop_oldest_event(self):
+        for lane in reversed(self._lanes):
+            if lane:
+                dropped = lane.popleft()
+                self._coalescedEvents.pop(dropped.id, None)
+                self._queuedCount -= 1
+                return
+
+
+    ## Call the registered handlers for an event.
+    #  @param self The object pointer.
+    #  @param event Event to dispatch.
+    #  @returns Return codes:
+    #    EventManagerStatusCode.Success
+    #    EventManagerStatusCode.InvalidEventID
+    def _dispatch_event(self, event):
+        callbacks = self._eventHandlers.get(event.id)
+
+        # Check to see event ID is valid, if an unknown event ID then return
+        # the 'invalid event id' error.
+        if callbacks is None:
+            return EventManagerStatusCode.InvalidEventID
+
+        #  Call the event processing functions, these are defined by the
+        #  registered callback functions.  Blocking callbacks are handed off to
+        #  the thread pool, completion is posted back to the dispatcher.
+        for subscriber in callbacks:
+            if not subscriber.blocking:
+                subscriber.callback(event)
+                continue
+
+            if self._blockingExecutor is None:
+                self._blockingExecutor = \
+                    concurrent.futures.ThreadPoolExecutor(
+                        max_workers=self._maxBlockingWorkers,
+                        thread_name_prefix='EventManagerBlocking')
+
+            future = self._blockingExecutor.submit(subscriber.callback, event)
+            future.add_done_callback(
+                lambda fut, sub=subscriber, evt=event:
+                self._post_completion(sub, evt, fut))
+
+        # Return 'success' status.
+        return EventManagerStatusCode.Success
+
+
+    ## Post the completion of a blocking handler back to the dispatcher, this
+    #  is called on the thread pool thread that ran the handler.
+    #  @param self The object pointer.
+    #  @param subscriber Subscriber whose callback has completed.
+    #  @param event Event that the callback was handling.
+    #  @param future Future holding the result of the callback.
+    def _post_completion(self, subscriber, event, future):
+        with self._queueLock:
+            self._completions.append((subscriber, event, future))
+
+            if self._dispatcherWaiting:
+                self._queueNotEmpty.notify()
+
+
+    ## Process the completions of blocking handlers, this is run on the
+    #  dispatcher thread.  An exception raised by a blocking handler is
+    #  re-raised here, just as it would have been if it ran synchronously.
+    #  @param self The object pointer.
+    def _process_completions(self):
+        while self._completions:
+            subscriber, event, future = self._completions.popleft()
+
+            if future.cancelled():
+                continue
+
+            result = future.result()
+
+            if subscriber.onComplete is not None:
+                subscriber.onComplete(event, result)
@@ -0,0 +1,96 @@
+'''
+Copyright 2019-2020 Secure Shed Project Dev Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+import heapq
+import itertools
+
+
+## Deadline scheduler for events, implemented as a binary heap ordered by
+#  deadline.  Cancelled timers are left in the heap and discarded when they
+#  reach the top, so scheduling and cancelling are both O(log n).
+#  Note: This class is not thread-safe, the owner must serialise access.
+class EventScheduler:
+
+    ## EventScheduler class constructor.
+    #  @param self The object pointer.
+    def __init__(self):
+        self._timers = []
+        self._timerIds = itertools.count(1)
+        self._active = {}
+
+
+    ## Property getter : Number of timers that are still scheduled.
+    @property
+    def ScheduledCount(self):
+        return len(self._active)
+
+
+    ## Schedule an event to be released at a deadline.
+    #  @param self The object pointer.
+    #  @param deadline Time the event is due, in the owner's clock.
+    #  @param event Event to release once the deadline is reached.
+    #  @returns Timer ID, which can be used to cancel the timer.
+    def Schedule(self, deadline, event):
+        timerId = next(self._timerIds)
+        self._active[timerId] = event
+        heapq.heappush(self._timers, (deadline, timerId))
+        return timerId
+
+
+    ## Cancel a scheduled timer.
+    #  @param self The object pointer.
+    #  @param timerId ID of the timer returned by Schedule().
+    #  @returns True if the timer was cancelled, False if unknown or expired.
+    def Cancel(self, timerId):
+        return self._active.pop(timerId, None) is not None
+
+
+    ## Get the deadline of the next timer that is due.
+    #  @param self The object pointer.
+    #  @returns Deadline of the next timer or None if none are scheduled.
+    def NextDeadline(self):
+        self._discard_cancelled()
+        return self._timers[0][0] if self._timers else None
+
+
+    ## Remove all of the timers whose deadline has been reached.
+    #  @param self The object pointer.
+    #  @param currentTime Current time, in the owner's clock.
+    #  @returns List of the due events, in deadline order.
+    def PopDueEvents(self, currentTime):
+        due = []
+
+        while self._timers and self._timers[0][0] <= currentTime:
+            _, timerId = heapq.heappop(self._timers)
+            event = self._active.pop(timerId, None)
+
+            if event is not None:
+                due.append(event)
+
+        return due
+
+
+    ## Remove all timers.
+    #  @param self The object pointer.
+    def Clear(self):
+        self._timers.clear()
+        self._active.clear()
+
+
+    ## Discard cancelled timers from the top of the heap.
+    #  @param self The object pointer.
+    def _discard_cancelled(self):
+        while self._timers and self._timers[0][1] not in self._active:
+            heapq.heappop(self._timers)
@@ -0,0 +1,229 @@
+'''
+Copyright 2019 Secure Shed Project Dev Team
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+import itertools
+import threading
+import jsonschema
+
+
+## Compiled validators, id(schema) => (schema, validator).  The schema is held
+#  so that its id cannot be reused by another object.
+_validators = {}
+
+## Serialises compiling a validator.
+_validatorsLock = threading.Lock()
+
+
+## Get the compiled validator for a schema.  The schema is checked and the
+#  validator built the first time, after that the same validator is returned,
+#  so validating doesn't pay for checking the schema on every call as
+#  jsonschema.validate() does.  Schemas are expected to be constants, they
+#  must not be modified once they have been compiled.
+#  @param schema JSON schema.
+#  @returns jsonschema validator instance.
+#  @throws jsonschema.exceptions.SchemaError if the schema is invalid.
+def GetValidator(schema):
+    entry = _validators.get(id(schema))
+    if entry is not None:
+        return entry[1]
+
+    with _validatorsLock:
+        entry = _validators.get(id(schema))
+        if entry is not None:
+            return entry[1]
+
+        validator_cls = jsonschema.validators.validator_for(schema)
+        validator_cls.check_schema(schema)
+        validator = validator_cls(schema)
+        _validators[id(schema)] = (schema, validator)
+
+    return validator
+
+
+## Validate an instance against a schema using its compiled validator.  This
+#  raises the same (best match) error that jsonschema.validate() would.
+#  @param instance Instance to validate.
+#  @param schema JSON schema.
+#  @throws jsonschema.exceptions.ValidationError if the instance is invalid.
+#  @throws jsonschema.exceptions.SchemaError if the schema is invalid.
+def Validate(instance, schema):
+    error = jsonschema.exceptions.best_match(
+        GetValidator(schema).iter_errors(instance))
+
+    if error is not None:
+        raise error
+
+
+## Python expressions that check the JSON type of a value, matching the type
+#  checks of jsonschema (e.g. booleans aren't numbers and 1.0 is an integer).
+_TYPE_CHECKS = {
+    'object': 'isinstance({0}, dict)',
+    'array': 'isinstance({0}, list)',
+    'string': 'isinstance({0}, str)',
+    'boolean': 'isinstance({0}, bool)',
+    'null': '{0} is None',
+    'number': '(isinstance({0}, (int, float)) and not isinstance({0}, bool))',
+    'integer': '((isinstance({0}, int) and not isinstance({0}, bool)) or '
+               '(isinstance({0}, float) and {0}.is_integer()))'
+}
+
+## Schema keywords that the fast validator generator supports.
+_FAST_KEYWORDS = {'type', 'properties', 'required', 'additionalProperties',
+                  'minimum', 'maximum'}
+
+
+## Raised when a schema uses something the fast validator generator doesn't
+#  support.
+class _UnsupportedSchema(Exception):
+    pass
+
+
+## Generate the source of a function that checks an instance against a small,
+#  fixed-shape schema (e.g. a REST message body) without going through the
+#  general jsonschema engine.  Only a subset of JSON schema is supported:
+#  objects with typed properties, required, additionalProperties (boolean)
+#  and minimum/maximum on numbers.
+#  @param schema JSON schema.
+#  @param name Name of the generated function.
+#  @returns Tuple of (source, constants the source refers to) or None if the
+#           schema isn't supported.
+def GenerateFastCheckSource(schema, name='is_valid'):
+    lines = [f'def {name}(instance):']
+    constants = {}
+    names = itertools.count()
+
+    try:
+        _generate_checks(schema, 'instance', 1, lines, constants, names)
+
+    except _UnsupportedSchema:
+        return None
+
+    lines.append('    return True')
+    return ('\n'.join(lines) + '\n', constants)
+
+
+## Compile a fast check function for a schema.
+#  @param schema JSON schema.
+#  @returns Function that returns True if an instance is valid, or None if
+#           the schema isn't supported.
+def CompileFastCheck(schema):
+    generated = GenerateFastCheckSource(schema)
+    if generated is None:
+        return None
+
+    source, namespace = generated
+    exec(compile(source, '<fast schema check>', 'exec'), namespace)  # pylint: disable=exec-used
+    return namespace['is_valid']
+
+
+## Get a validation function for a schema that uses a generated fast check,
+#  only an invalid instance goes through the compiled jsonschema validator
+#  (to raise the detailed error).  Schemas that the generator doesn't
+#  support are validated by the jsonschema validator alone.
+#  @param schema JSON schema.
+#  @returns Function taking the instance to validate, raising
+#           jsonschema.exceptions.ValidationError if it is invalid.
+def GetFastValidator(schema):
+    validator = GetValidator(schema)
+    is_valid = CompileFastCheck(schema)
+
+    if is_valid is None:
+        return validator.validate
+
+    def validate(instance):
+        if not is_valid(instance):
+            validator.validate(instance)
+
+    return validate
+
+
+## Generate the checks for a (sub)schema.
+#  @param schema JSON schema.
+#  @param var Name of the variable holding the value being checked.
+#  @param depth Indentation depth.
+#  @param lines Source lines, the checks are appended to these.
+#  @param constants Constants the source refers to, name => value.
+#  @param names Counter for generating unique names.
+def _generate_checks(schema, var, depth, lines, constants, names):
+    # pylint: disable=too-many-arguments
+    indent = '    ' * depth
+
+    if schema is True:
+        return
+
+    if schema is False:
+        lines.append(f'{indent}return False')
+        return
+
+    if not isinstance(schema, dict) or set(schema) - _FAST_KEYWORDS:
+        raise _UnsupportedSchema()
+
+    schema_type = schema.get('type')
+    if schema_type not in _TYPE_CHECKS:
+        raise _UnsupportedSchema()
+
+    lines.append(f'{indent}if not {_TYPE_CHECKS[schema_type].format(var)}:')
+    lines.append(f'{indent}    return False')
+
+    if 'minimum' in schema or 'maximum' in schema:
+        if schema_type not in ('number', 'integer'):
+            raise _UnsupportedSchema()
+
+        # Written the same way as jsonschema so that NaN compares the same.
+        if 'minimum' in schema:
+            lines.append(f"{indent}if {var} < {schema['minimum']!r}:")
+            lines.append(f'{indent}    return False')
+
+        if 'maximum' in schema:
+            lines.append(f"{indent}if {var} > {schema['maximum']!r}:")
+            lines.append(f'{indent}    return False')
+
+    object_keywords = {'properties', 'required', 'additionalProperties'}
+    if not object_keywords & set(schema):
+        return
+
+    if schema_type != 'object':
+        raise _UnsupportedSchema()
+
+    properties = schema.get('properties', {})
+
+    for key in schema.get('required', []):
+        lines.append(f'{indent}if {key!r} not in {var}:')
+        lines.append(f'{indent}    return False')
+
+    additional = schema.get('additionalProperties', True)
+    if additional is False:
+        allowed = f'_allowed{next(names)}'
+        constants[allowed] = frozenset(properties)
+        lines.append(f'{indent}if not {var}.keys() <= {allowed}:')
+        lines.append(f'{indent}    return False')
+
+    elif additional is not True:
+        raise _UnsupportedSchema()
+
+    for key, sub_schema in properties.items():
+        if sub_schema is True:
+            continue
+
+        if sub_schema is False:
+            lines.append(f'{indent}if {key!r} in {var}:')
+            lines.append(f'{indent}    return False')
+            continue
+
+        value = f'_value{next(names)}'
+        lines.append(f'{indent}if {key!r} in {var}:')
+        lines.append(f'{indent}    {value} = {var}[{key!r}]')
+        _generate_checks(sub_schema, value, depth + 1, lines, constants,
+                         names)
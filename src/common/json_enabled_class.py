@@ -14,6 +14,7 @@
 '''
 import json
 import jsonschema
+from common.SchemaValidators import Validate
 
 
 class JsonLoadingClass:
@@ -38,7 +39,7 @@ class JsonLoadingClass:
             return (None, f"Unable to parse json, reason: {excpt.msg}")
 
         try:
-            jsonschema.validate(instance=json_data, schema=json_schema)
+            Validate(json_data, json_schema)
 
         except jsonschema.exceptions.ValidationError as ex:
             msg = f", reason: {ex}" if show_validate_error is True else "."
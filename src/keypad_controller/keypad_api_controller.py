@@ -148,8 +148,7 @@ class KeypadApiController(resource.Resource):
             return b'Message body not valid JSON'
 
         try:
-            jsonschema.validate(instance=body,
-                                schema=schemas.KeypadLockRequest.Schema)
+            schemas.KeypadLockRequest.Validate(body)
 
         except jsonschema.exceptions.ValidationError as ex:
             err_msg = "ReceiveKeypadLockReq message failed validation, " +\
@@ -195,8 +194,7 @@ class KeypadApiController(resource.Resource):
             return b'Message body not valid JSON'
 
         try:
-            jsonschema.validate(instance=body,
-                                schema=schemas.RetrieveConsoleLogs.Schema)
+            schemas.RetrieveConsoleLogs.Validate(body)
 
         except jsonschema.exceptions.ValidationError as ex:
             err_msg = "ReceiveKeypadLockReq message failed validation, " +\
@@ -14,6 +14,7 @@ See the License for the specific language governing permissions and
 limitations under the License.
 '''
 # pylint: disable=C0413
+import os
 from twisted.internet import wxreactor
 from twisted.internet.task import LoopingCall
 wxreactor.install()
@@ -24,6 +25,7 @@ from configuration_manager import ConfigurationManager
 from keypad_api_controller import KeypadApiController
 from keypad_state_object import KeypadStateObject
 from log_store import LogStore
+from common.Clock import CreateClock
 from common.Logger import Logger, LogType
 
 
@@ -64,10 +66,23 @@ class KeypadApp:
             self._logger.Log(LogType.Error, self._config_mgr.last_error_msg)
             return
 
+        # The clock can be sped up for simulations, it must match the central
+        # controller's clock as lock times are shared.
+        try:
+            clock = CreateClock(os.getenv('KEYPAD_CLOCK_SPEED'),
+                                os.getenv('KEYPAD_CLOCK_ANCHOR'))
+
+        except ValueError as excpt:
+            self._logger.Log(LogType.Error,
+                             'Invalid clock configuration ' +
+                             '(KEYPAD_CLOCK_SPEED/KEYPAD_CLOCK_ANCHOR), ' +
+                             'reason : %s', excpt)
+            return
+
         wx_app = wx.App()
         reactor.registerWxApp(wx_app)
 
-        self._state_object = KeypadStateObject(config, self._logger)
+        self._state_object = KeypadStateObject(config, self._logger, clock)
 
         keypad_api_ctrl = KeypadApiController(config, self._state_object,
                                               self._log_store, self._logger)
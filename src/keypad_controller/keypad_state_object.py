@@ -14,7 +14,6 @@ See the License for the specific language governing permissions and
 limitations under the License.
 '''
 import enum
-import time
 from twisted.internet import reactor
 from gui.keypad_panel import KeypadPanel
 from gui.locked_panel import LockedPanel
@@ -22,16 +21,18 @@ from gui.comms_lost_panel import CommsLostPanel
 from common.APIClient.APIEndpointClient import APIEndpointClient
 from common.APIClient.HTTPStatusCode import HTTPStatusCode
 from common.APIClient.MIMEType import MIMEType
+from common.Clock import SystemClock
 from common.Logger import LogType
 
 
 class KeypadStateObject:
     # pylint: disable=too-many-instance-attributes
 
-    __slots__ = ['_central_ctrl_api_client', '_comms_lost_panel', '__config',
+    __slots__ = ['_central_ctrl_api_client', '_clock', '_comms_lost_panel',
+                 '__config',
                  '_current_panel', '_keypad_code', '_keypad_locked_panel',
-                 '_keypad_panel', '_last_reconnect_time', '_logger',
-                 '_new_panel']
+                 '_keypad_panel', '_last_reconnect_time', '_lock_expiry_call',
+                 '_logger', '_new_panel']
 
     CommLostRetryInterval = 5
 
@@ -53,7 +54,13 @@ class KeypadStateObject:
         return self._current_panel
 
 
-    def __init__(self, config, logger):
+    ## KeypadStateObject class constructor.
+    #  @param self The object pointer.
+    #  @param config Configuration items.
+    #  @param logger Logger instance.
+    #  @param clock Clock service, None = system clock.
+    def __init__(self, config, logger, clock=None):
+        self._clock = clock or SystemClock()
         self.__config = config
         self._current_panel = (None, None)
         self._new_panel = (self.PanelType.CommunicationsLost, {})
@@ -65,6 +72,7 @@ class KeypadStateObject:
         self._keypad_panel = KeypadPanel(self.__config)
 
         self._last_reconnect_time = 0
+        self._lock_expiry_call = None
 
         endpoint = self.__config.centralController.endpoint
         self._central_ctrl_api_client = APIEndpointClient(endpoint)
@@ -79,23 +87,16 @@ class KeypadStateObject:
             self._update_displayed_panel()
             return
 
-        # If the keypad is currently locked then we need to check to see if
-        # the keypad lock has timed out, if it has then reset the panel.
+        # If the keypad is currently locked then the expiry of the lock is
+        # handled by the timer started when the locked panel was displayed.
         if self._current_panel[0] == KeypadStateObject.PanelType.KeypadIsLocked:
-            curr_time = time.time()
-
-            if curr_time >= self._current_panel[1]:
-                keypad_panel = (KeypadStateObject.PanelType.Keypad, {})
-                self._current_panel = keypad_panel
-                self._update_displayed_panel()
-
             return
 
         # If the current panel is 'communications lost' then try to send a
         # please respond message to the central controller only at the alotted
         # intervals.
         if self._current_panel[0] == KeypadStateObject.PanelType.CommunicationsLost:
-            curr_time = time.time()
+            curr_time = self._clock.Monotonic()
 
             if curr_time > self._last_reconnect_time + self.CommLostRetryInterval:
                 self._last_reconnect_time = curr_time
@@ -135,6 +136,26 @@ class KeypadStateObject:
             return
 
 
+    ## Called by the reactor when the keypad lock has timed out, this resets
+    ## the panel back to the keypad.
+    #  @param self The object pointer.
+    def _keypad_lock_expired(self):
+        self._lock_expiry_call = None
+
+        if self._current_panel[0] != KeypadStateObject.PanelType.KeypadIsLocked:
+            return
+
+        # The reactor runs in real time, if the clock hasn't reached the lock
+        # expiry time yet then wait for the remainder.
+        if self._clock.Time() < self._current_panel[1]:
+            self._schedule_lock_expiry(self._current_panel[1])
+            return
+
+        keypad_panel = (KeypadStateObject.PanelType.Keypad, {})
+        self._current_panel = keypad_panel
+        self._update_displayed_panel()
+
+
     ## Display a new panel by firstly hiding all of panels and then after that
     ## show just the expected one.
     #  @param self The object pointer.
@@ -143,9 +164,18 @@ class KeypadStateObject:
         self._keypad_panel.Hide()
         self._keypad_locked_panel.Hide()
 
-        panel, _ = self._current_panel
+        panel, panel_params = self._current_panel
+
+        # Any previous keypad lock timer is no longer relevant.
+        if self._lock_expiry_call is not None and \
+           self._lock_expiry_call.active():
+            self._lock_expiry_call.cancel()
+        self._lock_expiry_call = None
 
         if panel == KeypadStateObject.PanelType.KeypadIsLocked:
+            # Schedule the end of the lock at the lock expiry time rather than
+            # checking the time on every panel check.
+            self._schedule_lock_expiry(panel_params)
             self._keypad_locked_panel.display()
 
         elif panel == KeypadStateObject.PanelType.CommunicationsLost:
@@ -156,3 +186,12 @@ class KeypadStateObject:
 
         # The displayed panel has changed, we can now reset newPanel.
         self._new_panel = self._current_panel
+
+
+    ## Start the timer for the keypad lock expiring.
+    #  @param self The object pointer.
+    #  @param expiry_time Time (in clock time) that the lock expires.
+    def _schedule_lock_expiry(self, expiry_time):
+        lock_secs = max(0, expiry_time - self._clock.Time())
+        self._lock_expiry_call = reactor.callLater(
+            self._clock.RealTimeout(lock_secs), self._keypad_lock_expired)
@@ -88,8 +88,7 @@ class KeypadControllerPanel(wx.Panel):
         # Validate that the json body conforms to the expected schema.
         # If the message isn't valid then a 400 error should be generated.
         try:
-            jsonschema.validate(instance=msg_body,
-                                schema=schemas.RequestLogsResponse.Schema)
+            schemas.RequestLogsResponse.Validator.validate(msg_body)
 
         # Caught a message body validation failed, abort read.
         except jsonschema.exceptions.ValidationError:
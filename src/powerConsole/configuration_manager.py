@@ -17,6 +17,7 @@ import collections
 import json
 import jsonschema
 from configuration_json_schema import CONFIGURATIONJSONSCHEMA
+from common.SchemaValidators import Validate
 
 ## Central controller section configuration items.
 CentralController = collections.namedtuple('CentralController',
@@ -100,8 +101,7 @@ class ConfigurationManager:
             return None
 
         try:
-            jsonschema.validate(instance=config_json,
-                                schema=CONFIGURATIONJSONSCHEMA)
+            Validate(config_json, CONFIGURATIONJSONSCHEMA)
 
         except jsonschema.exceptions.ValidationError as ex:
             self._last_error_msg = f"Configuration file {filename} failed " + \